@@ -1,12 +1,37 @@
-from fastapi import FastAPI
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from backend.routes.enrollment_routes import router as enroll_router
 from backend.routes.auth_routes import router as auth_router
 from backend.routes.stt_routes import router as stt_router
 from backend.routes.payment_routes import router as pay_router
 from backend.routes.encryption_routes import router as enc_router
+from backend.routes.metrics_routes import router as metrics_router
+from backend.routes.health_routes import router as health_router
+from backend.services.ml_executor import MLUnavailable
+from backend.services.warmup_service import start_warmup
+
+# DEBUG also logs packet plaintext and key material; OFF silences backend logging.
+LOG_LEVEL = os.environ.get("MESHPE_LOG_LEVEL", "INFO").upper()
+logging.basicConfig(
+    level=logging.CRITICAL + 1 if LOG_LEVEL == "OFF" else LOG_LEVEL,
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load on a background thread so the server accepts connections at once;
+    # /health/ready turns 200 when they are warm.
+    start_warmup()
+    yield
 
-app = FastAPI(title="VoiceWave MeshPay Backend")
+
+app = FastAPI(title="VoiceWave MeshPay Backend", lifespan=lifespan)
 
 # Allow frontend (Vite dev server) to talk to backend, including OPTIONS preflight
 app.add_middleware(
@@ -25,8 +50,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(MLUnavailable)
+async def ml_unavailable_handler(request: Request, exc: MLUnavailable):
+    # Overloaded or timed-out inference: tell clients to retry instead of a generic 400
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+
 app.include_router(enroll_router, prefix="/enroll", tags=["enrollment"])
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(stt_router, prefix="/stt", tags=["stt"])
 app.include_router(pay_router, prefix="/payment", tags=["payment"])
 app.include_router(enc_router, prefix="/encrypt", tags=["encrypt"])
+app.include_router(metrics_router, tags=["metrics"])
+app.include_router(health_router, prefix="/health", tags=["health"])
@@ -10,3 +10,19 @@ def aes_encrypt(plaintext: bytes):
     ciphertext, tag = cipher.encrypt_and_digest(plaintext)
 
     return key, iv, ciphertext, tag
+
+
+def batch_record_nonce(n: int) -> bytes:
+    """
+    GCM nonce of record n in a sealed batch. Every batch has its own key, so a counter is unique.
+    """
+    return n.to_bytes(12, "big")
+
+
+def aes_gcm_seal(key: bytes, nonce: bytes, plaintext: bytes, associated_data: bytes = b""):
+    """
+    AES-GCM under a caller-supplied key and nonce; a nonce must never repeat under one key.
+    """
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    cipher.update(associated_data)
+    return cipher.encrypt_and_digest(plaintext)
@@ -1,9 +1,16 @@
 from pathlib import Path
-from Crypto.PublicKey import RSA
+from Crypto.PublicKey import ECC, RSA
+from backend.crypto.key_manager import CachedKey, KeyManager
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 BANK_PRIV_PATH = BASE_DIR / "bank_private.pem"
 BANK_PUB_PATH = BASE_DIR / "bank_public.pem"
+# X25519 keypair for version 2 packets
+BANK_X25519_PRIV_PATH = BASE_DIR / "bank_x25519_private.pem"
+BANK_X25519_PUB_PATH = BASE_DIR / "bank_x25519_public.pem"
+
+_keys = KeyManager()
+_x25519_keys = KeyManager(parse=ECC.import_key)
 
 
 def ensure_bank_keys() -> None:
@@ -19,13 +26,59 @@ def ensure_bank_keys() -> None:
     BANK_PUB_PATH.write_bytes(key.publickey().export_key("PEM"))
 
 
+def ensure_bank_x25519_keys() -> None:
+    """
+    Same as ensure_bank_keys, for the bank's X25519 keypair.
+    """
+    if BANK_X25519_PRIV_PATH.exists() and BANK_X25519_PUB_PATH.exists():
+        return
+
+    key = ECC.generate(curve="Curve25519")
+    BANK_X25519_PRIV_PATH.write_text(key.export_key(format="PEM"))
+    BANK_X25519_PUB_PATH.write_text(key.public_key().export_key(format="PEM"))
+
+
+def _cached(path: Path) -> CachedKey:
+    try:
+        return _keys.get(path)
+    except FileNotFoundError:
+        ensure_bank_keys()
+        return _keys.get(path)
+
+
 def load_bank_private_key() -> RSA.RsaKey:
-    ensure_bank_keys()
-    return RSA.import_key(BANK_PRIV_PATH.read_bytes())
+    return _cached(BANK_PRIV_PATH).key
 
 
 def load_bank_public_key() -> RSA.RsaKey:
-    ensure_bank_keys()
-    return RSA.import_key(BANK_PUB_PATH.read_bytes())
+    return _cached(BANK_PUB_PATH).key
+
+
+def bank_private_cipher():
+    """
+    PKCS1_OAEP cipher for the bank's private key, shared across calls.
+    """
+    return _cached(BANK_PRIV_PATH).oaep
+
+
+def bank_public_cipher():
+    """
+    PKCS1_OAEP cipher for the bank's public key, shared across calls.
+    """
+    return _cached(BANK_PUB_PATH).oaep
+
+
+def _cached_x25519(path: Path) -> CachedKey:
+    try:
+        return _x25519_keys.get(path)
+    except FileNotFoundError:
+        ensure_bank_x25519_keys()
+        return _x25519_keys.get(path)
+
+
+def load_bank_x25519_private_key() -> ECC.EccKey:
+    return _cached_x25519(BANK_X25519_PRIV_PATH).key
 
 
+def load_bank_x25519_public_key() -> ECC.EccKey:
+    return _cached_x25519(BANK_X25519_PUB_PATH).key
@@ -1,4 +1,5 @@
 from Crypto.PublicKey import RSA
+from backend.crypto.bank_keys import bank_public_cipher
 from backend.crypto.bank_keys import load_bank_public_key as _auto_load_pub
 
 
@@ -8,3 +9,10 @@ def load_bank_public_key() -> RSA.RsaKey:
     Ensures keys exist and returns the bank's public key.
     """
     return _auto_load_pub()
+
+
+def load_bank_public_cipher():
+    """
+    Reusable PKCS1_OAEP cipher over the bank's public key.
+    """
+    return bank_public_cipher()
@@ -0,0 +1,72 @@
+"""
+Parsed keys (and, for RSA, their OAEP ciphers), cached per PEM file.
+
+Importing a PEM is the expensive part of sealing and unsealing a packet: a
+private key import runs a full consistency check of the key. Keys are parsed
+once and reparsed only when the file's mtime or size changes, which is checked
+at most every KEY_RECHECK_SECONDS, so rotating a key on disk still takes effect
+without a restart.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from Crypto.Cipher import PKCS1_OAEP
+from Crypto.PublicKey import RSA
+
+KEY_RECHECK_SECONDS = float(os.environ.get("MESHPE_KEY_RECHECK_SECONDS", "1.0"))
+
+
+class CachedKey:
+    def __init__(self, key, stamp: Tuple[int, int], checked: float):
+        self.key = key
+        self.stamp = stamp
+        self.checked = checked
+        self._oaep = None
+
+    @property
+    def oaep(self):
+        # OAEP ciphers keep no per-message state, so one instance serves every call
+        if self._oaep is None:
+            self._oaep = PKCS1_OAEP.new(self.key)
+        return self._oaep
+
+
+def _stamp(path: Path) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class KeyManager:
+    def __init__(
+        self, parse: Callable[[bytes], object] = RSA.import_key, recheck_seconds: float = KEY_RECHECK_SECONDS
+    ):
+        self.parse = parse
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._keys: Dict[Path, CachedKey] = {}
+
+    def get(self, path: Path) -> CachedKey:
+        """
+        Cached key for the PEM at path. Raises FileNotFoundError if it doesn't exist.
+        """
+        now = time.monotonic()
+        cached = self._keys.get(path)
+        if cached is not None and now - cached.checked < self.recheck_seconds:
+            return cached
+
+        with self._lock:
+            cached = self._keys.get(path)
+            stamp = _stamp(path)
+            if cached is None or cached.stamp != stamp:
+                cached = CachedKey(self.parse(Path(path).read_bytes()), stamp, now)
+                self._keys[path] = cached
+            else:
+                cached.checked = now
+            return cached
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
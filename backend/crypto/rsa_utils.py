@@ -2,6 +2,10 @@ from Crypto.Cipher import PKCS1_OAEP
 from Crypto.PublicKey import RSA
 
 
-def rsa_encrypt(public_key: RSA.RsaKey, data: bytes) -> bytes:
-    cipher = PKCS1_OAEP.new(public_key)
+def rsa_encrypt(public_key, data: bytes) -> bytes:
+    """
+    public_key is an RSA key or an already prepared PKCS1_OAEP cipher;
+    pass the cipher on hot paths to skip building one per call.
+    """
+    cipher = PKCS1_OAEP.new(public_key) if isinstance(public_key, RSA.RsaKey) else public_key
     return cipher.encrypt(data)
@@ -0,0 +1,73 @@
+"""
+Hybrid sealing with an ephemeral X25519 key agreement (packet version 2).
+
+The sender generates a one-off X25519 key, agrees a shared secret with the
+bank's static X25519 key, and derives the AES-256-GCM key and nonce from it with
+HKDF-SHA256. Only the 32-byte ephemeral public key travels with the ciphertext,
+instead of a 256-byte RSA-wrapped AES key and a separate IV. Since every packet
+gets a fresh key, deriving the nonce as well is safe.
+"""
+from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.DH import import_x25519_public_key, key_agreement
+from Crypto.Protocol.KDF import HKDF
+from Crypto.PublicKey import ECC
+
+CURVE = "Curve25519"
+HKDF_INFO = b"meshpe-packet-v2"
+KEY_BYTES = 32
+NONCE_BYTES = 12
+
+
+def _derive(shared_secret: bytes, ephemeral_public: bytes, recipient_public: bytes):
+    # Both public keys go into the salt, binding the derived key to this exchange
+    okm = HKDF(
+        shared_secret,
+        KEY_BYTES + NONCE_BYTES,
+        salt=ephemeral_public + recipient_public,
+        hashmod=SHA256,
+        context=HKDF_INFO,
+    )
+    return okm[:KEY_BYTES], okm[KEY_BYTES:]
+
+
+def _raw(key: ECC.EccKey) -> bytes:
+    return key.public_key().export_key(format="raw")
+
+
+def x25519_new_key(recipient_public: ECC.EccKey):
+    """
+    Fresh (ephemeral_public, key, nonce) that only the holder of the recipient's
+    private key can rederive from ephemeral_public.
+    """
+    ephemeral = ECC.generate(curve=CURVE)
+    shared = key_agreement(static_priv=ephemeral, static_pub=recipient_public, kdf=lambda secret: secret)
+    epk = _raw(ephemeral)
+    key, nonce = _derive(shared, epk, _raw(recipient_public))
+    return epk, key, nonce
+
+
+def x25519_recover_key(recipient_private: ECC.EccKey, ephemeral_public: bytes):
+    """
+    (key, nonce) for an ephemeral_public produced by x25519_new_key.
+    """
+    peer = import_x25519_public_key(ephemeral_public)
+    shared = key_agreement(static_priv=recipient_private, static_pub=peer, kdf=lambda secret: secret)
+    return _derive(shared, ephemeral_public, _raw(recipient_private))
+
+
+def x25519_seal(recipient_public: ECC.EccKey, plaintext: bytes):
+    """
+    Returns (ephemeral_public, ciphertext, tag), all bytes.
+    """
+    epk, key, nonce = x25519_new_key(recipient_public)
+    ciphertext, tag = AES.new(key, AES.MODE_GCM, nonce=nonce).encrypt_and_digest(plaintext)
+    return epk, ciphertext, tag
+
+
+def x25519_open(recipient_private: ECC.EccKey, ephemeral_public: bytes, ciphertext: bytes, tag: bytes) -> bytes:
+    """
+    Inverse of x25519_seal; raises ValueError if the packet was tampered with.
+    """
+    key, nonce = x25519_recover_key(recipient_private, ephemeral_public)
+    return AES.new(key, AES.MODE_GCM, nonce=nonce).decrypt_and_verify(ciphertext, tag)
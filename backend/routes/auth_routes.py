@@ -1,13 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from pydantic import BaseModel
+import hmac
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Header
+from pydantic import BaseModel, Field
 import soundfile as sf
-from backend.services.auth_service import get_challenge, verify_voice
+from backend.services.auth_service import get_challenge, identify_voice, verify_voice
 from backend.services.enrollment_service import enroll_user_voice
-from backend.storage.user_store import create_or_update_user, get_user, add_contact, list_contacts
-from backend.utils.audio_utils import load_audio_mono_from_bytes
+from backend.services.ml_executor import run_ml, MLUnavailable
+from backend.storage.user_store import (
+    CONTACTS_PAGE_SIZE,
+    MAX_CONTACTS_PAGE_SIZE,
+    add_contacts,
+    create_or_update_user,
+    get_user,
+    page_contacts,
+)
+from ml.liveness import check_liveness
+from ml.prepared_audio import InsufficientSpeech, PreparedAudio
 
 router = APIRouter()
 
+MAX_IMPORT_CONTACTS = 1000
+
+# Shared secret for counter-staff endpoints, sent as X-Staff-Key. Unset disables them.
+STAFF_API_KEY = os.environ.get("MESHPE_STAFF_API_KEY", "")
+
+
+def require_staff(x_staff_key: Optional[str] = Header(None)) -> None:
+    if not STAFF_API_KEY:
+        raise HTTPException(status_code=403, detail="Staff endpoints are disabled")
+    if not x_staff_key or not hmac.compare_digest(x_staff_key.encode(), STAFF_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid staff key")
+
 
 # ----- Existing low-level endpoints (kept for compatibility) -----
 
@@ -21,8 +46,12 @@ async def challenge(user_id: str):
 async def verify(user_id: str, file: UploadFile = File(...)):
     try:
         data = await file.read()
-        audio, sr = load_audio_mono_from_bytes(data)
-        return verify_voice(user_id, audio)
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data)
+        return await run_ml("verify", verify_voice, user_id, prepared)
+    except MLUnavailable:
+        raise
+    except InsufficientSpeech as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         raise HTTPException(status_code=400, detail="Verification failed")
 
@@ -44,19 +73,48 @@ async def signup(
     try:
         # Use first audio sample for enrollment
         data = await audio_1.read()
-        audio, sr = load_audio_mono_from_bytes(data)
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data)
 
         user_id = phone
-        enroll_user_voice(user_id, audio)
+        await run_ml("enroll", enroll_user_voice, user_id, prepared)
         user = create_or_update_user(user_id=user_id, name=name, phone=phone, language=language)
 
         return {"success": True, "data": {"user": user}, "message": "Signup successful"}
+    except MLUnavailable:
+        raise
     except Exception as e:
         # Return structured error instead of HTTP 400 so frontend can show it
         print("Signup failed:", e)
         return {"success": False, "error": str(e)}
 
 
+@router.post("/identify", dependencies=[Depends(require_staff)])
+async def identify(audio: UploadFile = File(...)):
+    """
+    1:N lookup for counter staff: who is speaking, without a phone number.
+    Needs the X-Staff-Key header. Returns the speaker only when they are clearly
+    ahead of every other enrolled user; the score is never sent back, so the
+    endpoint can't be used to hill-climb towards someone's voiceprint.
+    """
+    try:
+        data = await audio.read()
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data)
+        if not await run_ml("liveness", check_liveness, prepared):
+            return {"success": False, "error": "Liveness check failed"}
+
+        match = await run_ml("verify", identify_voice, prepared)
+        if match is None:
+            return {"success": False, "error": "No matching enrolled voice"}
+        user = get_user(match["user_id"]) or {}
+        return {"success": True, "data": {"user_id": match["user_id"], "name": user.get("name")}}
+    except MLUnavailable:
+        raise
+    except InsufficientSpeech as e:
+        return {"success": False, "error": str(e)}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Identification failed")
+
+
 class LoginStartReq(BaseModel):
     user_id: str
 
@@ -87,9 +145,9 @@ async def login_verify(
     """
     try:
         data = await audio.read()
-        audio_arr, sr = load_audio_mono_from_bytes(data)
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data)
 
-        result = verify_voice(user_id, audio_arr)
+        result = await run_ml("verify", verify_voice, user_id, prepared)
         if not result.get("exists"):
             return {"success": False, "error": "No enrolled voice for this user"}
         if not result.get("verified"):
@@ -101,6 +159,10 @@ async def login_verify(
             user = create_or_update_user(user_id=user_id, name=user_id, phone=user_id, language=language)
 
         return {"success": True, "data": {"user": user}}
+    except MLUnavailable:
+        raise
+    except InsufficientSpeech as e:
+        return {"success": False, "error": str(e)}
     except Exception:
         raise HTTPException(status_code=400, detail="Login verification failed")
 
@@ -118,13 +180,43 @@ class ContactReq(BaseModel):
     contact_id: str
 
 
+class ContactImportReq(BaseModel):
+    contacts: List[ContactReq] = Field(..., max_length=MAX_IMPORT_CONTACTS)
+
+
 @router.post("/contacts/add")
 async def contacts_add(user_id: str, payload: ContactReq):
-    contacts = add_contact(user_id, payload.contact_name, payload.contact_id)
-    return {"success": True, "data": {"contacts": contacts}}
+    contact = {"name": payload.contact_name, "id": payload.contact_id}
+    if add_contacts(user_id, [contact])["duplicates"]:
+        return {"success": False, "error": f"{payload.contact_id} is already in your contacts"}
+    return {"success": True, "data": {"contact": contact}}
+
+
+@router.post("/contacts/import")
+async def contacts_import(user_id: str, payload: ContactImportReq):
+    """
+    Bulk add, e.g. an address book sync sent in batches of up to MAX_IMPORT_CONTACTS.
+    Contacts already saved are skipped and reported back by id.
+    """
+    result = add_contacts(user_id, [{"name": c.contact_name, "id": c.contact_id} for c in payload.contacts])
+    return {"success": True, "data": result}
 
 
 @router.get("/contacts/list")
-async def contacts_list(user_id: str):
-    contacts = list_contacts(user_id)
-    return {"success": True, "data": {"contacts": contacts}}
+async def contacts_list(
+    user_id: str,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = CONTACTS_PAGE_SIZE,
+):
+    """
+    One page of contacts, in the order they were added; with q, only names starting
+    with q, in name order. Pass next_cursor back as cursor to get the following page.
+    """
+    try:
+        contacts, next_cursor = page_contacts(
+            user_id, limit=max(1, min(limit, MAX_CONTACTS_PAGE_SIZE)), cursor=cursor, prefix=q
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": {"contacts": contacts, "next_cursor": next_cursor}}
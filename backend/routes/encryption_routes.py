@@ -1,10 +1,14 @@
+from typing import List
+
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from backend.services.encryption_service import encrypt_packet
+from pydantic import BaseModel, Field
+from backend.services.encryption_service import encrypt_batch, encrypt_packet
 from backend.services.mesh_service import send_to_mesh
 
 router = APIRouter()
 
+MAX_BATCH_PACKETS = 1000
+
 
 class PacketModel(BaseModel):
     packet_id: str
@@ -26,3 +30,20 @@ async def seal_and_send(payload: PacketModel):
         return {"encrypted": encrypted, "forwarded": forwarded}
     except Exception:
         raise HTTPException(status_code=400, detail="Encryption failed")
+
+
+class PacketBatchModel(BaseModel):
+    packets: List[PacketModel] = Field(..., min_length=1, max_length=MAX_BATCH_PACKETS)
+
+
+@router.post("/seal-send-batch")
+async def seal_and_send_batch(payload: PacketBatchModel):
+    """
+    Flush a queue of offline payments as one batch: one wrapped key for all of them.
+    """
+    try:
+        encrypted = encrypt_batch([p.dict() for p in payload.packets])
+        forwarded = await send_to_mesh(encrypted)
+        return {"encrypted": encrypted, "forwarded": forwarded}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Encryption failed")
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 import numpy as np
 from backend.services.enrollment_service import enroll_user_voice
-from backend.utils.audio_utils import load_audio_mono_from_bytes
+from backend.services.ml_executor import run_ml, MLUnavailable
+from ml.prepared_audio import InsufficientSpeech, PreparedAudio
 
 router = APIRouter()
 
@@ -10,8 +11,12 @@ router = APIRouter()
 async def enroll(user_id: str, file: UploadFile = File(...)):
     try:
         data = await file.read()
-        audio, sr = load_audio_mono_from_bytes(data)
-        enroll_user_voice(user_id, audio)
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data)
+        await run_ml("enroll", enroll_user_voice, user_id, prepared)
         return {"status": "ok"}
+    except MLUnavailable:
+        raise
+    except InsufficientSpeech as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         raise HTTPException(status_code=400, detail="Enrollment failed")
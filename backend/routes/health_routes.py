@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from backend.services.warmup_service import is_ready, warmup_state
+from ml.model_registry import loaded_models
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def live():
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once warm-up has finished, 503 before that.
+    Reports which models are loaded either way.
+    """
+    body = {"ready": is_ready(), "models": loaded_models(), "warmup": warmup_state()}
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
@@ -1,3 +1,6 @@
+import logging
+from typing import Optional
+
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
 from pydantic import BaseModel
 import numpy as np
@@ -7,11 +10,18 @@ from backend.services.stt_service import process_command
 from backend.services.encryption_service import encrypt_packet
 from backend.services.auth_service import verify_voice
 from backend.services.mesh_service import send_to_mesh
-from backend.storage.user_store import get_user, list_contacts
-from backend.utils.audio_utils import load_audio_mono_from_bytes
+from backend.services.contact_index import MIN_MATCH_SCORE, get_contact_index, normalize
+from backend.services.ml_executor import run_ml, MLUnavailable
+from backend.storage.user_store import contacts_with_version, get_contact, get_user, list_contacts
+from backend.utils.metrics import timed
 from ml.liveness import check_liveness
+from ml.prepared_audio import InsufficientSpeech, PreparedAudio
+from ml.whisper_pool import WhisperPoolFull
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+CONFIRM_MIN_SPEECH_SECONDS = 0.2
 
 
 class PaymentReq(BaseModel):
@@ -50,24 +60,28 @@ async def initiate_payment(
     """
     try:
         data = await audio.read()
-        audio_arr, sr = load_audio_mono_from_bytes(data)
+        # Resample/normalise once; verification, liveness and STT all read from it.
+        # Silent or near-silent clips are turned away here, before any model runs.
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data)
 
         # First-level voice auth + liveness on the command itself
-        verify_result = verify_voice(user_id, audio_arr)
+        verify_result = await run_ml("verify", verify_voice, user_id, prepared)
         if not verify_result.get("exists"):
             return {"success": False, "error": "No enrolled voice for this user"}
         if not verify_result.get("verified"):
             return {"success": False, "error": "Voice verification failed for command"}
 
-        if not check_liveness(audio_arr):
+        if not await run_ml("liveness", check_liveness, prepared):
             return {"success": False, "error": "Liveness check failed for command"}
 
         # STT + NLP
-        cmd = process_command(audio_arr, sr)
+        cmd = await run_ml("stt", process_command, prepared)
         # Debug log so we can see what Whisper+NLP extracted
-        print(f"Received audio bytes: {len(data)}")
-        print(f"Audio array shape: {audio_arr.shape}, Max amp: {np.max(np.abs(audio_arr))}")
-        print("Payment command parsed:", cmd)
+        logger.debug(
+            "Received audio bytes: %d, shape: %s, max amp: %.3f, speech: %.2fs",
+            len(data), prepared.raw.shape, np.max(np.abs(prepared.raw)), prepared.speech_seconds,
+        )
+        logger.info("Payment command parsed: %s", cmd)
         action = cmd.get("action")
         amount = cmd.get("amount")
         receiver_text = cmd.get("receiver")
@@ -83,21 +97,33 @@ async def initiate_payment(
         if not user:
             raise HTTPException(status_code=400, detail="Unknown user")
 
-        contacts = list_contacts(user_id)
-        receiver_text_lower = receiver_text.lower()
-        matched_contact = None
-        for c in contacts:
-            if c.get("name", "").lower().startswith(receiver_text_lower):
-                matched_contact = c
-                break
+        # Prefix, phonetic and small-typo matches, so Whisper misspellings still resolve
+        with timed("contact_match"):
+            version, contacts = contacts_with_version(user_id)
+            index = get_contact_index(user_id, contacts, version)
+            matched_contact = index.resolve(receiver_text)
         if not matched_contact:
+            candidates = index.search(receiver_text)
+            # resolve() only declines a good match when several score alike
+            ambiguous = sum(c["score"] >= MIN_MATCH_SCORE for c in candidates) > 1
+            error = (
+                f"Several contacts match '{receiver_text}', please say the full name"
+                if ambiguous
+                else f"Receiver '{receiver_text}' not found in contacts"
+            )
             return {
                 "success": False,
-                "error": f"Receiver '{receiver_text}' not found in contacts",
+                "error": error,
+                "data": {
+                    "suggestions": [c["contact"]["name"] for c in candidates],
+                    "candidates": [{"name": c["contact"]["name"], "id": c["contact"]["id"]} for c in candidates],
+                },
             }
 
         payment_info = {
             "receiver_name": matched_contact["name"],
+            # Confirm pays exactly this contact, not whatever the name matches then
+            "receiver_id": matched_contact["id"],
             "amount": amount,
             "currency": "INR",
         }
@@ -109,14 +135,33 @@ async def initiate_payment(
                 "raw_text": cmd.get("raw_text"),
             },
         }
-    except HTTPException:
+    except (HTTPException, MLUnavailable):
         raise
+    except InsufficientSpeech as e:
+        return {"success": False, "error": str(e)}
+    except WhisperPoolFull:
+        raise HTTPException(status_code=503, detail="Speech recognition busy, try again")
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Payment initiation failed")
         raise HTTPException(status_code=400, detail=f"Payment initiation failed: {str(e)}")
 
 
+def _confirmed_receiver(user_id: str, receiver_name: str, receiver_id: Optional[str]):
+    """
+    The contact to pay: looked up by id when given (and it must still carry the
+    confirmed name), else by exact normalised name. "ambiguous" if the name fits several.
+    """
+    wanted = normalize(receiver_name)
+    if receiver_id:
+        contact = get_contact(user_id, receiver_id)
+        return contact if contact and normalize(contact["name"]) == wanted else None
+
+    matches = [c for c in list_contacts(user_id) if normalize(c.get("name", "")) == wanted]
+    if len(matches) > 1:
+        return "ambiguous"
+    return matches[0] if matches else None
+
+
 @router.post("/confirm")
 async def confirm_payment(
     user_id: str = Form(...),
@@ -124,6 +169,7 @@ async def confirm_payment(
     receiver_name: str = Form(...),
     amount: int = Form(...),
     language: str = Form("english"),
+    receiver_id: Optional[str] = Form(None),
 ):
     """
     Step 2: user says "yes" to confirm.
@@ -133,29 +179,33 @@ async def confirm_payment(
     """
     try:
         data = await audio.read()
-        audio_arr, sr = load_audio_mono_from_bytes(data)
+        # A bare "yes" is short, so confirmation accepts a shorter speech span
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data, CONFIRM_MIN_SPEECH_SECONDS)
 
         # Voice re-verification
-        verify_result = verify_voice(user_id, audio_arr)
+        verify_result = await run_ml("verify", verify_voice, user_id, prepared)
         if not verify_result.get("exists"):
             return {"success": False, "error": "No enrolled voice for this user"}
         if not verify_result.get("verified"):
             return {"success": False, "error": "Voice verification failed during confirmation"}
 
         # Liveness check
-        if not check_liveness(audio_arr):
+        if not await run_ml("liveness", check_liveness, prepared):
             return {"success": False, "error": "Liveness check failed"}
 
         user = get_user(user_id)
         if not user:
             raise HTTPException(status_code=400, detail="Unknown user")
 
-        contacts = list_contacts(user_id)
-        receiver_contact = None
-        for c in contacts:
-            if c.get("name", "").lower() == receiver_name.lower():
-                receiver_contact = c
-                break
+        # This step moves money, so no fuzzy matching: the contact id from /initiate,
+        # or else a name that matches exactly one contact
+        with timed("contact_match"):
+            receiver_contact = _confirmed_receiver(user_id, receiver_name, receiver_id)
+        if receiver_contact == "ambiguous":
+            return {
+                "success": False,
+                "error": f"Several contacts are named '{receiver_name}'; start the payment again",
+            }
         if not receiver_contact:
             return {
                 "success": False,
@@ -193,7 +243,9 @@ async def confirm_payment(
                 "payment_info": payment_info,
             },
         }
-    except HTTPException:
+    except (HTTPException, MLUnavailable):
         raise
+    except InsufficientSpeech as e:
+        return {"success": False, "error": str(e)}
     except Exception:
         raise HTTPException(status_code=400, detail="Payment confirmation failed")
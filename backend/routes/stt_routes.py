@@ -1,16 +1,103 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import json
+import os
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
 import numpy as np
-from backend.services.stt_service import process_command
-from backend.utils.audio_utils import load_audio_mono_from_bytes
+from backend.services.stt_service import process_command, whisper_pool_stats
+from backend.services.ml_executor import run_ml, MLUnavailable
+from backend.utils.audio_utils import StreamingDecoder
+from ml.prepared_audio import InsufficientSpeech, PreparedAudio
+from ml.stt_stream import StreamingTranscriber
+from ml.whisper_pool import WhisperPoolFull
 
 router = APIRouter()
 
+# Per-connection limits for /stream; payment commands are a few seconds long.
+STREAM_MAX_BYTES = int(os.environ.get("MESHPE_STT_STREAM_MAX_BYTES", str(8 * 1024 * 1024)))
+STREAM_MAX_SECONDS = float(os.environ.get("MESHPE_STT_STREAM_MAX_SECONDS", "60"))
+
 
 @router.post("/command")
 async def stt_command(file: UploadFile = File(...)):
     try:
         data = await file.read()
-        audio, sr = load_audio_mono_from_bytes(data)
-        return process_command(audio, sr)
+        prepared = await run_ml("decode", PreparedAudio.from_upload, data)
+        return await run_ml("stt", process_command, prepared)
+    except MLUnavailable:
+        raise
+    except InsufficientSpeech as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WhisperPoolFull:
+        raise HTTPException(status_code=503, detail="STT busy, try again")
     except Exception:
         raise HTTPException(status_code=400, detail="STT failed")
+
+
+@router.get("/pool")
+async def stt_pool():
+    """
+    Whisper pool occupancy: busy slots, queue depth and wait times.
+    """
+    return whisper_pool_stats()
+
+
+@router.websocket("/stream")
+async def stt_stream(websocket: WebSocket):
+    """
+    Streaming variant of /command.
+
+    Protocol:
+      - optional text frame {"event": "start", "format": "webm" | "pcm_s16le" | "pcm_f32le",
+        "sample_rate": <int, required for pcm>} (defaults to webm, as MediaRecorder sends)
+      - binary frames with audio chunks as they are recorded
+      - text frame {"event": "end"} once the user stops speaking
+
+    The server pushes {"type": "partial", raw_text, action, amount, receiver, stable}
+    while audio arrives and a single {"type": "final", ...} after "end".
+    A stream over STREAM_MAX_BYTES or STREAM_MAX_SECONDS gets {"type": "error"} and
+    is closed with code 1009.
+    """
+    await websocket.accept()
+    decoder = StreamingDecoder()
+    transcriber = StreamingTranscriber()
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes") is not None:
+                if decoder.bytes_received + len(message["bytes"]) > STREAM_MAX_BYTES:
+                    await _close_too_big(websocket, f"Stream exceeds {STREAM_MAX_BYTES} bytes")
+                    return
+                samples = await run_ml("decode", decoder.feed, message["bytes"])
+                transcriber.append(samples, decoder.samplerate)
+                if transcriber.seconds > STREAM_MAX_SECONDS:
+                    await _close_too_big(websocket, f"Stream exceeds {STREAM_MAX_SECONDS:g} seconds")
+                    return
+                if transcriber.due():
+                    partial = await run_ml("stt", transcriber.partial)
+                    await websocket.send_json(partial)
+                continue
+
+            event = json.loads(message.get("text") or "{}")
+            if event.get("event") == "start":
+                decoder = StreamingDecoder(event.get("format", "webm"), event.get("sample_rate"))
+                transcriber = StreamingTranscriber()
+            elif event.get("event") == "end":
+                transcriber.append(await run_ml("decode", decoder.flush), decoder.samplerate)
+                final = await run_ml("stt", transcriber.final)
+                await websocket.send_json(final)
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        await websocket.send_json({"type": "error", "error": f"STT failed: {e}"})
+        await websocket.close(code=1011)
+
+
+async def _close_too_big(websocket: WebSocket, error: str) -> None:
+    await websocket.send_json({"type": "error", "error": error})
+    await websocket.close(code=1009)
@@ -1,18 +1,25 @@
+from typing import Union
+
 import numpy as np
 from ml.authenticate_voice import (
+    identify_from_audio_array,
     verify_from_audio_array,
     generate_challenge_word,
-    get_voiceprint_path
 )
-import os
+from ml.voiceprint_index import get_voiceprint_index
+from ml.prepared_audio import PreparedAudio
 
 
 def get_challenge(user_id: str):
-    if not os.path.exists(get_voiceprint_path(user_id)):
+    if not get_voiceprint_index().contains(user_id):
         return {"has_voiceprint": False, "word": None}
 
     return {"has_voiceprint": True, "word": generate_challenge_word()}
 
 
-def verify_voice(user_id: str, audio: np.ndarray):
-    return verify_from_audio_array(user_id, audio)
+def verify_voice(user_id: str, audio: Union[np.ndarray, PreparedAudio], sr: int = 16000):
+    return verify_from_audio_array(user_id, audio, samplerate=sr)
+
+
+def identify_voice(audio: Union[np.ndarray, PreparedAudio], sr: int = 16000):
+    return identify_from_audio_array(audio, samplerate=sr)
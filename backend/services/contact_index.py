@@ -0,0 +1,270 @@
+"""
+Per-user index over contact names for resolving spoken receivers.
+
+Every name token is indexed three ways:
+  - a sorted token list, for prefix lookups by bisection
+  - a phonetic key, so transliteration variants ("seemran" / "simran") collide
+  - a symmetric-delete table (SymSpell), for edit-distance lookups up to
+    MAX_EDIT_DISTANCE without scanning the contact list
+
+A cached index is keyed on the user's contacts_version from user_store, which
+changes on every write to their contacts. When only new contacts were appended,
+they are indexed incrementally; any other change rebuilds the index. At most
+MESHPE_CONTACT_INDEX_CACHE_SIZE users' indexes are kept, least recently used
+evicted first.
+"""
+import bisect
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+MAX_EDIT_DISTANCE = 2
+# Tokens shorter than this only tolerate one edit.
+MIN_LEN_FOR_TWO_EDITS = 5
+MIN_MATCH_SCORE = 0.6
+MAX_CANDIDATES = 5
+# resolve() refuses to pick when the runner-up scores within this of the best match
+AMBIGUITY_MARGIN = 0.05
+# Score of a query equal to a contact's whole normalised name; ranks just above token matches
+WHOLE_NAME_SCORE = 1.0 + 1e-3
+
+MATCH_SCORES = {"exact": 1.0, "prefix": 0.9, "phonetic": 0.8, "edit1": 0.75, "edit2": 0.6}
+
+# Common romanisation variants, folded together by phonetic_key.
+_PHONETIC_RULES = [
+    ("ee", "i"), ("ii", "i"), ("oo", "u"), ("uu", "u"), ("aa", "a"), ("y", "i"),
+    ("ph", "f"), ("w", "v"), ("z", "j"), ("q", "k"), ("ck", "k"), ("x", "ks"),
+]
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def phonetic_key(token: str) -> str:
+    """
+    Fold spelling variants of the same sound: "seemran" and "simran", "priyaa" and
+    "priya", "rahul" and "raul" all share a key. Vowels are kept, so unlike
+    Soundex short names don't collapse onto each other.
+    """
+    for src, dst in _PHONETIC_RULES:
+        token = token.replace(src, dst)
+    if not token:
+        return ""
+    # Aspirates and silent h ("bh", "dh", "kh", "rahul") drop out after the first letter
+    token = token[0] + token[1:].replace("h", "")
+    return re.sub(r"(.)\1+", r"\1", token)
+
+
+def _deletes(token: str, max_distance: int) -> Set[str]:
+    out = {token}
+    frontier = {token}
+    for _ in range(max_distance):
+        nxt = set()
+        for word in frontier:
+            for i in range(len(word)):
+                nxt.add(word[:i] + word[i + 1:])
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+def _max_distance(token: str) -> int:
+    return MAX_EDIT_DISTANCE if len(token) >= MIN_LEN_FOR_TWO_EDITS else 1
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 if above limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class ContactIndex:
+    def __init__(self, contacts: Optional[List[dict]] = None):
+        self.contacts: List[dict] = []
+        self._full: Dict[str, List[int]] = defaultdict(list)
+        self._tokens: Dict[str, Set[int]] = defaultdict(set)
+        self._sorted_tokens: List[str] = []
+        self._phonetic: Dict[str, Set[str]] = defaultdict(set)
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        for contact in contacts or []:
+            self.add(contact)
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    def add(self, contact: dict) -> None:
+        idx = len(self.contacts)
+        self.contacts.append(contact)
+        name = normalize(contact.get("name", ""))
+        self._full[name].append(idx)
+
+        for token in name.split():
+            if token not in self._tokens:
+                bisect.insort(self._sorted_tokens, token)
+                self._phonetic[phonetic_key(token)].add(token)
+                for d in _deletes(token, _max_distance(token)):
+                    self._deletes[d].add(token)
+            self._tokens[token].add(idx)
+
+    # ----- per-token lookups -----
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        out = []
+        for token in self._sorted_tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            out.append(token)
+        return out
+
+    def _token_matches(self, q: str) -> Dict[str, float]:
+        """
+        Indexed tokens similar to query token q, with their best match score.
+        """
+        found: Dict[str, float] = {}
+
+        def _offer(token: str, kind: str) -> None:
+            score = MATCH_SCORES[kind]
+            if score > found.get(token, 0.0):
+                found[token] = score
+
+        if q in self._tokens:
+            _offer(q, "exact")
+        for token in self._prefix_tokens(q):
+            _offer(token, "prefix")
+        for token in self._phonetic.get(phonetic_key(q), ()):
+            _offer(token, "phonetic")
+
+        limit = _max_distance(q)
+        candidates: Set[str] = set()
+        for d in _deletes(q, limit):
+            candidates |= self._deletes.get(d, set())
+        for token in candidates:
+            if token in found:
+                continue
+            token_limit = min(limit, _max_distance(token))
+            dist = edit_distance(q, token, token_limit)
+            if dist <= token_limit:
+                _offer(token, f"edit{dist}")
+        return found
+
+    # ----- queries -----
+
+    def _ranked(self, query: str) -> List[tuple]:
+        """
+        (contact index, raw score, match kind) for every candidate, best first.
+        """
+        q = normalize(query)
+        if not q:
+            return []
+
+        scores: Dict[int, float] = {}
+        kinds: Dict[int, str] = {}
+
+        for idx in self._full.get(q, []):
+            scores[idx], kinds[idx] = WHOLE_NAME_SCORE, "exact"
+
+        q_tokens = q.split()
+        per_contact: Dict[int, List[float]] = defaultdict(lambda: [0.0] * len(q_tokens))
+        for i, qt in enumerate(q_tokens):
+            for token, score in self._token_matches(qt).items():
+                for idx in self._tokens[token]:
+                    per_contact[idx][i] = max(per_contact[idx][i], score)
+
+        for idx, token_scores in per_contact.items():
+            score = sum(token_scores) / len(token_scores)
+            if score > scores.get(idx, 0.0):
+                scores[idx] = score
+                kinds[idx] = _kind_for(score)
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], len(self.contacts[item[0]].get("name", ""))),
+        )
+        return [(idx, score, kinds[idx]) for idx, score in ranked]
+
+    def search(self, query: str, limit: int = MAX_CANDIDATES) -> List[dict]:
+        """
+        Ranked candidates as {"contact", "score", "match"}, best first.
+        A contact's score is the mean over query tokens of its best token match.
+        """
+        return [
+            {"contact": self.contacts[idx], "score": round(min(score, 1.0), 3), "match": kind}
+            for idx, score, kind in self._ranked(query)[:limit]
+        ]
+
+    def resolve(self, query: str, min_score: float = MIN_MATCH_SCORE) -> Optional[dict]:
+        """
+        Best matching contact, or None if nothing scores at least min_score or the
+        best match isn't clearly ahead: "rahul" against "Rahul Verma" and "Rahul
+        Sharma" is a tie, and guessing could pay the wrong person. A query equal to
+        one contact's whole name still wins over partial matches of the others.
+        """
+        ranked = self._ranked(query)[:2]
+        if not ranked or ranked[0][1] < min_score:
+            return None
+        if len(ranked) > 1 and ranked[1][1] >= min_score:
+            best, runner_up = ranked[0][1], ranked[1][1]
+            unique_whole_name = best == WHOLE_NAME_SCORE and runner_up < WHOLE_NAME_SCORE
+            if not unique_whole_name and best - runner_up < AMBIGUITY_MARGIN:
+                return None
+        return self.contacts[ranked[0][0]]
+
+
+def _kind_for(score: float) -> str:
+    for kind, kind_score in MATCH_SCORES.items():
+        if score >= kind_score:
+            return kind
+    return "partial"
+
+
+# Most recently used users' indexes kept in memory
+INDEX_CACHE_SIZE = int(os.environ.get("MESHPE_CONTACT_INDEX_CACHE_SIZE", "10000"))
+
+_indexes: "OrderedDict[str, Tuple[int, ContactIndex]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_contact_index(user_id: str, contacts: List[dict], version: int) -> ContactIndex:
+    """
+    Cached index for user_id's contacts at contacts_version `version`.
+    A user with no contacts left has their entry dropped rather than cached.
+    """
+    with _indexes_lock:
+        if not contacts:
+            _indexes.pop(user_id, None)
+            return ContactIndex()
+
+        cached = _indexes.get(user_id)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(user_id)
+            return cached[1]
+        index = cached[1] if cached is not None else None
+        if index is not None and len(index) <= len(contacts) and contacts[:len(index)] == index.contacts:
+            for contact in contacts[len(index):]:
+                index.add(contact)
+        else:
+            index = ContactIndex(contacts)
+        _indexes[user_id] = (version, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
@@ -1,23 +1,42 @@
 import json
-from backend.crypto.aes_utils import aes_encrypt
+import logging
+import os
+from typing import List
+from backend.crypto.aes_utils import aes_encrypt, aes_gcm_seal, batch_record_nonce
+from backend.crypto.bank_keys import load_bank_x25519_public_key
 from backend.crypto.rsa_utils import rsa_encrypt
-from backend.crypto.key_loader import load_bank_public_key
+from backend.crypto.key_loader import load_bank_public_cipher
+from backend.crypto.x25519_utils import x25519_new_key, x25519_seal
+from backend.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Sealing scheme for outgoing packets, carried in the packet's "v" field:
+#   1 - AES-GCM key wrapped with the bank's RSA-2048 key (packets without "v")
+#   2 - ephemeral X25519 + HKDF-SHA256 -> AES-GCM; needs a bank that understands it
+PACKET_VERSION = int(os.environ.get("MESHPE_PACKET_VERSION", "1"))
+PACKET_VERSIONS = (1, 2)
+
+
+@timed("encrypt")
+def encrypt_packet(packet: dict, version: int = None):
+    version = version or PACKET_VERSION
+    if version == 2:
+        return _encrypt_packet_x25519(packet)
+    if version != 1:
+        raise ValueError(f"Unknown packet version: {version}")
 
-def encrypt_packet(packet: dict):
     data = json.dumps(packet).encode()
     aes_key, iv, ciphertext, tag = aes_encrypt(data)
 
-    print("\n--- [ENCRYPTION START] ---")
-    print(f"Original Data: {data}")
-    print(f"Generated AES Key: {aes_key.hex()}")
-    print(f"AES IV: {iv.hex()}")
-    print(f"Ciphertext: {ciphertext.hex()}")
-    print(f"Auth Tag: {tag.hex()}")
+    encrypted_key = rsa_encrypt(load_bank_public_cipher(), aes_key)
 
-    rsa_key = load_bank_public_key()
-    encrypted_key = rsa_encrypt(rsa_key, aes_key)
-    print(f"Encrypted AES Key (RSA): {encrypted_key.hex()}")
-    print("--- [ENCRYPTION END] ---\n")
+    # Plaintext and key material only at DEBUG, never in normal logs
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Encrypted packet %s: data=%s aes_key=%s iv=%s ciphertext=%s tag=%s encrypted_key=%s",
+            packet["packet_id"], data, aes_key.hex(), iv.hex(), ciphertext.hex(), tag.hex(), encrypted_key.hex(),
+        )
 
     return {
         "encrypted_key": encrypted_key.hex(),
@@ -27,3 +46,63 @@ def encrypt_packet(packet: dict):
         "timestamp": packet["timestamp"],
         "packet_id": packet["packet_id"]
     }
+
+
+def _encrypt_packet_x25519(packet: dict):
+    data = json.dumps(packet).encode()
+    ephemeral_public, ciphertext, tag = x25519_seal(load_bank_x25519_public_key(), data)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Encrypted packet %s (v2): data=%s epk=%s ciphertext=%s tag=%s",
+            packet["packet_id"], data, ephemeral_public.hex(), ciphertext.hex(), tag.hex(),
+        )
+
+    return {
+        "v": 2,
+        "epk": ephemeral_public.hex(),
+        "ciphertext": ciphertext.hex(),
+        "tag": tag.hex(),
+        "timestamp": packet["timestamp"],
+        "packet_id": packet["packet_id"]
+    }
+
+
+@timed("encrypt")
+def encrypt_batch(packets: List[dict], version: int = None):
+    """
+    Seal many packets under one session key, so the bank does one private-key
+    operation per batch instead of one per packet.
+
+    The key is RSA-wrapped (version 1) or agreed over X25519 (version 2) exactly
+    as for a single packet. Each packet becomes its own AES-GCM record with a
+    counter nonce, authenticated together with its packet_id so records can't be
+    swapped; the bank verifies and accepts or rejects each record on its own.
+    """
+    version = version or PACKET_VERSION
+    if version == 2:
+        ephemeral_public, batch_key, _ = x25519_new_key(load_bank_x25519_public_key())
+        envelope = {"v": 2, "epk": ephemeral_public.hex()}
+    elif version == 1:
+        batch_key = os.urandom(32)
+        envelope = {"v": 1, "encrypted_key": rsa_encrypt(load_bank_public_cipher(), batch_key).hex()}
+    else:
+        raise ValueError(f"Unknown packet version: {version}")
+
+    records = []
+    for n, packet in enumerate(packets):
+        data = json.dumps(packet).encode()
+        ciphertext, tag = aes_gcm_seal(batch_key, batch_record_nonce(n), data, packet["packet_id"].encode())
+        records.append(
+            {
+                "n": n,
+                "packet_id": packet["packet_id"],
+                "timestamp": packet["timestamp"],
+                "ciphertext": ciphertext.hex(),
+                "tag": tag.hex(),
+            }
+        )
+
+    logger.debug("Sealed batch of %d packets (v%d)", len(records), version)
+    envelope["records"] = records
+    return envelope
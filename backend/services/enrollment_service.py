@@ -1,6 +1,9 @@
+from typing import Union
+
 import numpy as np
 from ml.enroll_voice import enroll_from_audio_array
+from ml.prepared_audio import PreparedAudio
 
 
-def enroll_user_voice(user_id: str, audio: np.ndarray):
-    return enroll_from_audio_array(user_id, audio)
+def enroll_user_voice(user_id: str, audio: Union[np.ndarray, PreparedAudio], sr: int = 16000):
+    return enroll_from_audio_array(user_id, audio, samplerate=sr)
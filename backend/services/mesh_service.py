@@ -1,13 +1,19 @@
 import socket
 import json
 import asyncio
+import logging
+import os
 from binascii import unhexlify
-from bleak import BleakScanner
+from typing import Iterator, Optional, Tuple
 from Crypto.Cipher import AES as CryptoAES
-from Crypto.Cipher import PKCS1_OAEP
 
-from backend.crypto.bank_keys import load_bank_private_key
-from backend.crypto.aes_utils import AES
+from backend.crypto.bank_keys import bank_private_cipher, load_bank_x25519_private_key
+from backend.crypto.x25519_utils import x25519_open, x25519_recover_key
+from backend.crypto.aes_utils import AES, batch_record_nonce
+from backend.utils.mesh_frame import decode_frame, encode_frame, is_frame
+from backend.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
 
 # --- CONFIGURATION ---
 RFCOMM_CHANNEL = 4
@@ -19,11 +25,15 @@ CACHED_BANK_MAC = None
 # TARGET: DEVICE C (RELAY NODE)
 BANK_MAC_ADDRESS = "14:F6:D8:02:D6:4E"
 
+# "json": hex JSON, which every bank node reads; "frame": compact binary frames
+# (backend/utils/mesh_frame.py). A standalone bank deployed without mesh_frame.py
+# drops frames after the send has already reported success, so frames stay opt-in
+# until every bank node in the mesh ships with it.
+WIRE_FORMAT = os.environ.get("MESHPE_WIRE_FORMAT", "json")
+
 # --- DECRYPTION HELPERS (For Local Simulation Fallback) ---
 def _rsa_decrypt_with_bank_private_key(encrypted_key_hex: str) -> bytes:
-    private_key = load_bank_private_key()
-    cipher = PKCS1_OAEP.new(private_key)
-    return cipher.decrypt(unhexlify(encrypted_key_hex))
+    return bank_private_cipher().decrypt(unhexlify(encrypted_key_hex))
 
 def _aes_decrypt_packet(aes_key: bytes, iv_hex: str, ciphertext_hex: str, tag_hex: str) -> bytes:
     iv = unhexlify(iv_hex)
@@ -32,6 +42,70 @@ def _aes_decrypt_packet(aes_key: bytes, iv_hex: str, ciphertext_hex: str, tag_he
     cipher = CryptoAES.new(aes_key, CryptoAES.MODE_GCM, nonce=iv)
     return cipher.decrypt_and_verify(ciphertext, tag)
 
+def _x25519_decrypt_packet(epk_hex: str, ciphertext_hex: str, tag_hex: str) -> bytes:
+    return x25519_open(
+        load_bank_x25519_private_key(), unhexlify(epk_hex), unhexlify(ciphertext_hex), unhexlify(tag_hex)
+    )
+
+def decrypt_packet(encrypted_packet: dict) -> bytes:
+    """
+    Plaintext of a sealed packet, for either packet version (see encryption_service).
+    """
+    version = encrypted_packet.get("v", 1)
+    if version == 2:
+        return _x25519_decrypt_packet(encrypted_packet["epk"], encrypted_packet["ciphertext"], encrypted_packet["tag"])
+    if version != 1:
+        raise ValueError(f"Unknown packet version: {version}")
+    aes_key = _rsa_decrypt_with_bank_private_key(encrypted_packet["encrypted_key"])
+    return _aes_decrypt_packet(aes_key, encrypted_packet["iv"], encrypted_packet["ciphertext"], encrypted_packet["tag"])
+
+def encode_for_wire(encrypted: dict) -> bytes:
+    if WIRE_FORMAT == "json":
+        return json.dumps(encrypted).encode("utf-8")
+    return encode_frame(encrypted)
+
+def decode_from_wire(data: bytes) -> dict:
+    """
+    Sealed packet or batch from either wire format.
+    """
+    if is_frame(data):
+        return decode_frame(data)
+    return json.loads(data.decode("utf-8"))
+
+def is_batch(encrypted: dict) -> bool:
+    return "records" in encrypted
+
+def unseal_batch(batch: dict) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Unwraps the batch key once, then verifies and decrypts records one at a time,
+    yielding (packet_id, plaintext), or (packet_id, None) for a record that fails
+    authentication. A bad record doesn't stop the rest of the batch.
+    Raises ValueError if the batch key itself can't be recovered.
+    """
+    version = batch.get("v", 1)
+    if version == 2:
+        batch_key, _ = x25519_recover_key(load_bank_x25519_private_key(), unhexlify(batch["epk"]))
+    elif version == 1:
+        batch_key = _rsa_decrypt_with_bank_private_key(batch["encrypted_key"])
+    else:
+        raise ValueError(f"Unknown packet version: {version}")
+
+    seen = set()
+    for record in batch["records"]:
+        packet_id = record.get("packet_id")
+        n = record.get("n")
+        # A repeated counter means a replayed or forged record: GCM nonces never repeat in a batch
+        if not isinstance(n, int) or n in seen:
+            yield packet_id, None
+            continue
+        seen.add(n)
+        try:
+            cipher = CryptoAES.new(batch_key, CryptoAES.MODE_GCM, nonce=batch_record_nonce(n))
+            cipher.update(packet_id.encode())
+            yield packet_id, cipher.decrypt_and_verify(unhexlify(record["ciphertext"]), unhexlify(record["tag"]))
+        except (KeyError, ValueError, AttributeError):
+            yield packet_id, None
+
 # --- BLUETOOTH CLIENT (RFCOMM) ---
 
 async def scan_and_select_device():
@@ -39,38 +113,40 @@ async def scan_and_select_device():
     Scans for BLE devices and asks user to select one.
     Returns the MAC address of the selected device.
     """
-    print("[Mesh Service] Scanning for Bluetooth devices (5s)...")
+    from bleak import BleakScanner
+
+    logger.info("Scanning for Bluetooth devices (5s)...")
     try:
         devices = await BleakScanner.discover(timeout=5.0)
     except Exception as e:
-        print(f"[Mesh Service] Scanning failed: {e}")
+        logger.warning("Scanning failed: %s", e)
         return None
     
     if not devices:
-        print("[Mesh Service] No devices found.")
+        logger.info("No devices found.")
         return None
 
     # Filter out unnamed devices to reduce noise
     named_devices = [d for d in devices if d.name and d.name.strip()]
     
     if not named_devices:
-        print("[Mesh Service] No named devices found.")
+        logger.info("No named devices found.")
         return None
 
-    print(f"\n[Mesh Service] Found {len(devices)} devices:")
+    logger.info("Found %d devices:", len(devices))
     for i, dev in enumerate(devices):
         name = dev.name or "Unknown"
-        print(f"  {i+1}. {name} ({dev.address})")
+        logger.info("  %d. %s (%s)", i + 1, name, dev.address)
 
     # Auto-match "MeshBank"
     target = next((d for d in devices if d.name and "MeshBank" in d.name), None)
     
     if target:
-        print(f"[Mesh Service] Auto-detected Bank Device: {target.name}")
+        logger.info("Auto-detected Bank Device: %s", target.name)
         return target.address
     
-    print("[Mesh Service] Could not auto-find device named 'MeshBank'.")
-    print("[Mesh Service] Please rename the Bank Device to 'MeshBank' for auto-discovery.")
+    logger.warning("Could not auto-find device named 'MeshBank'.")
+    logger.warning("Please rename the Bank Device to 'MeshBank' for auto-discovery.")
     return None
 
 async def send_packet_via_rfcomm(packet: dict) -> bool:
@@ -88,12 +164,12 @@ async def send_packet_via_rfcomm(packet: dict) -> bool:
         CACHED_BANK_MAC = await scan_and_select_device()
         
     if not CACHED_BANK_MAC:
-        print("[Mesh Service] ERROR: Could not find Bank Node.")
-        print("TIP: Rename the other device to 'MeshBank' in Bluetooth Settings.")
-        print("TIP: Or manually set BANK_MAC_ADDRESS in backend/services/mesh_service.py")
+        logger.error("Could not find Bank Node.")
+        logger.error("TIP: Rename the other device to 'MeshBank' in Bluetooth Settings.")
+        logger.error("TIP: Or manually set BANK_MAC_ADDRESS in backend/services/mesh_service.py")
         return False
 
-    print(f"[Mesh Service] Connecting to {CACHED_BANK_MAC} on Channel {RFCOMM_CHANNEL}...")
+    logger.info("Connecting to %s on Channel %s...", CACHED_BANK_MAC, RFCOMM_CHANNEL)
     
     try:
         # Create Bluetooth Socket
@@ -101,18 +177,17 @@ async def send_packet_via_rfcomm(packet: dict) -> bool:
         def _connect_and_send():
             sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
             sock.connect((CACHED_BANK_MAC, RFCOMM_CHANNEL))
-            data = json.dumps(packet).encode('utf-8')
-            sock.send(data)
+            sock.sendall(encode_for_wire(packet))
             sock.close()
             return True
 
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, _connect_and_send)
         
-        print("[Mesh Service] Packet sent successfully!")
+        logger.info("Packet sent successfully!")
         return True
     except Exception as e:
-        print(f"[Mesh Service] RFCOMM Connection failed: {e}")
+        logger.warning("RFCOMM Connection failed: %s", e)
         # Clear cache in case MAC changed or device is wrong
         CACHED_BANK_MAC = None 
         return False
@@ -124,40 +199,40 @@ async def send_to_mesh(encrypted_packet: dict) -> bool:
     Sends the encrypted packet via Bluetooth (RFCOMM).
     If Bluetooth fails, falls back to local simulation.
     """
+    with timed("mesh_send"):
+        return await _send_to_mesh(encrypted_packet)
+
+
+async def _send_to_mesh(encrypted_packet: dict) -> bool:
     try:
-        print("\n[Mesh Service] Initiating Bluetooth transmission...")
+        logger.info("Initiating Bluetooth transmission...")
         
         success = await send_packet_via_rfcomm(encrypted_packet)
         
         if success:
             return True
             
-        print("[Mesh Service] Bluetooth failed. Falling back to LOCAL SIMULATION (Single Device Mode)...")
+        logger.warning("Bluetooth failed. Falling back to LOCAL SIMULATION (Single Device Mode)...")
         
         # --- LOCAL SIMULATION OF BANK NODE ---
-        print("\n--- [DECRYPTION START (SIMULATED BANK)] ---")
-        print(f"Received Encrypted Key: {encrypted_packet['encrypted_key'][:20]}...")
-        
-        # 1) Recover AES session key with bank's private RSA key
-        aes_key = _rsa_decrypt_with_bank_private_key(encrypted_packet["encrypted_key"])
-        print(f"Decrypted AES Key: {aes_key.hex()}")
-
-        # 2) Decrypt packet JSON with AES-GCM
-        plaintext = _aes_decrypt_packet(
-            aes_key,
-            encrypted_packet["iv"],
-            encrypted_packet["ciphertext"],
-            encrypted_packet["tag"],
-        )
-        print(f"Decrypted Payload (Plaintext): {plaintext}")
-        print("--- [DECRYPTION END] ---\n")
+        logger.debug("Simulated bank received packet version %s", encrypted_packet.get("v", 1))
+
+        if is_batch(encrypted_packet):
+            results = list(unseal_batch(encrypted_packet))
+            failed = [packet_id for packet_id, plaintext in results if plaintext is None]
+            logger.info("Simulated bank received batch of %d packets, %d rejected", len(results), len(failed))
+            return not failed
+
+        # Recover the AES-GCM key (RSA unwrap or X25519 agreement) and decrypt the packet JSON
+        plaintext = decrypt_packet(encrypted_packet)
 
         from json import loads
         packet = loads(plaintext.decode("utf-8"))
-        print("Dummy bank server received packet:", packet)
+        logger.info("Simulated bank received packet %s", packet.get("packet_id"))
+        logger.debug("Simulated bank decrypted payload: %s", packet)
         return True
         # -------------------------------------
 
     except Exception as e:
-        print(f"[Mesh Service] Transmission/Simulation failed: {e}")
+        logger.error("Transmission/Simulation failed: %s", e)
         return False
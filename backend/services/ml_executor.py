@@ -0,0 +1,92 @@
+"""
+Runs CPU-bound ML work (decoding, embeddings, liveness, Whisper) off the asyncio
+event loop so cheap endpoints keep responding while inference is in flight.
+
+A thread pool is used rather than a process pool: the models live once per
+process (see ml/model_registry.py) and torch, ctranslate2 and numpy release the
+GIL during the heavy parts, so threads get real parallelism without copying
+models or pickling audio between processes.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+ML_MAX_WORKERS = int(os.environ.get("MESHPE_ML_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Jobs queued or running before new ones are turned away.
+ML_MAX_PENDING = int(os.environ.get("MESHPE_ML_MAX_PENDING", "32"))
+
+# Seconds a handler waits for each stage; override with MESHPE_ML_TIMEOUT_<STAGE>.
+STAGE_TIMEOUTS = {
+    "decode": 10.0,
+    "enroll": 20.0,
+    "verify": 15.0,
+    "liveness": 10.0,
+    "stt": 60.0,
+}
+DEFAULT_TIMEOUT = 30.0
+
+
+class MLUnavailable(RuntimeError):
+    status_code = 503
+
+
+class MLBusy(MLUnavailable):
+    status_code = 503
+
+
+class MLTimeout(MLUnavailable):
+    status_code = 504
+
+
+_executor = ThreadPoolExecutor(max_workers=ML_MAX_WORKERS, thread_name_prefix="ml")
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _stage_timeout(stage: str) -> float:
+    override = os.environ.get(f"MESHPE_ML_TIMEOUT_{stage.upper()}")
+    if override:
+        return float(override)
+    return STAGE_TIMEOUTS.get(stage, DEFAULT_TIMEOUT)
+
+
+def _release(_future) -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def run_ml(stage: str, fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the ML thread pool and await its result.
+
+    Raises MLBusy when ML_MAX_PENDING jobs are already queued or running, and
+    MLTimeout when the stage exceeds its timeout. A timed-out job that already
+    started keeps its worker until it finishes and still counts as pending, so
+    backpressure reflects real pool occupancy.
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= ML_MAX_PENDING:
+            raise MLBusy(f"ML queue full, rejected {stage}")
+        _pending += 1
+
+    try:
+        future = _executor.submit(partial(fn, *args, **kwargs))
+    except Exception:
+        with _pending_lock:
+            _pending -= 1
+        raise
+    future.add_done_callback(_release)
+
+    timeout = _stage_timeout(stage)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        raise MLTimeout(f"{stage} timed out after {timeout:g}s")
+
+
+def ml_stats() -> dict:
+    return {"workers": ML_MAX_WORKERS, "pending": _pending, "max_pending": ML_MAX_PENDING}
@@ -1,6 +1,21 @@
+from typing import Union
+
 import numpy as np
-from ml.stt_whisper import transcribe_and_parse_from_audio_array
+from ml.stt_whisper import transcribe_and_parse_from_audio_array, cascade_stats
+from ml.prepared_audio import PreparedAudio
+from ml.model_registry import get_whisper_model, get_fast_whisper_model, loaded_models
 
 
-def process_command(audio: np.ndarray, sr: int):
+def process_command(audio: Union[np.ndarray, PreparedAudio], sr: int = 16000):
     return transcribe_and_parse_from_audio_array(audio, sr)
+
+
+def whisper_pool_stats():
+    # Don't load Whisper just to report on it
+    loaded = loaded_models()
+    stats = {"loaded": loaded["whisper"], "cascade": cascade_stats()}
+    if loaded["whisper"]:
+        stats.update(get_whisper_model().stats())
+    if loaded["whisper_fast"]:
+        stats["fast"] = get_fast_whisper_model().stats()
+    return stats
@@ -0,0 +1,152 @@
+"""
+Background warm-up, started once the app is up so uvicorn binds straight away.
+
+Loading the models is only part of the cold-start cost: librosa JIT-compiles
+its MFCC kernels on first use, torch and PyAV initialise lazily, and
+faster-whisper allocates its buffers on the first transcription. Warm-up runs
+each of those once on a synthetic clip, and opens (or packs) the voiceprint
+index, so /health/ready only reports ready when the first real request will run
+at full speed.
+
+A failing step is retried with backoff. If it still fails, warm-up finishes as
+"degraded": the process reports ready, since that stage will load on first use
+like it would without warm-up, and /health/ready lists the error.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get("MESHPE_WARMUP", "1") == "1"
+WARMUP_RETRIES = int(os.environ.get("MESHPE_WARMUP_RETRIES", "3"))
+WARMUP_RETRY_SECONDS = float(os.environ.get("MESHPE_WARMUP_RETRY_SECONDS", "2"))
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_state: Dict[str, object] = {"status": "pending", "steps": {}, "errors": {}, "seconds": None}
+
+
+def _warm_clip(seconds: float = 1.0, sr: int = 16000) -> np.ndarray:
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 4 * t))).astype(np.float32)
+
+
+def _decode():
+    import io
+
+    import av  # noqa: F401 - loaded here so the first webm upload doesn't pay for it
+    import soundfile as sf
+    from backend.utils.audio_utils import load_audio_mono_from_bytes
+
+    buf = io.BytesIO()
+    sf.write(buf, _warm_clip(), 16000, format="WAV")
+    load_audio_mono_from_bytes(buf.getvalue())
+
+
+def _embed():
+    from ml.embedding_batcher import embed_batch
+    from ml.prepared_audio import PreparedAudio
+
+    prepared = PreparedAudio(_warm_clip())
+    # Runs resemblyzer's preprocessing; its VAD trims a synthetic tone to nothing,
+    # so the encoder itself is warmed on the untrimmed span.
+    prepared.trimmed
+    embed_batch([prepared.speech])
+
+
+def _liveness():
+    from ml.liveness import _extract_features, _load_model
+
+    features = _extract_features(_warm_clip(), 16000)
+    model = _load_model()
+    if model is not None and features is not None:
+        model.predict_proba(features)
+
+
+def _voiceprints():
+    from ml.voiceprint_index import get_voiceprint_index
+
+    get_voiceprint_index().load()
+
+
+def _stt():
+    from ml.model_registry import WHISPER_CASCADE, get_fast_whisper_model, get_whisper_model
+
+    models = [get_whisper_model()] + ([get_fast_whisper_model()] if WHISPER_CASCADE else [])
+    for model in models:
+        model.transcribe(_warm_clip(), beam_size=1, without_timestamps=True)
+
+
+WARMUP_STEPS = (
+    ("decode", _decode),
+    ("embed", _embed),
+    ("liveness", _liveness),
+    ("voiceprints", _voiceprints),
+    ("stt", _stt),
+)
+
+
+def _run_step(name: str, step) -> None:
+    delay = WARMUP_RETRY_SECONDS
+    for attempt in range(1, WARMUP_RETRIES + 2):
+        step_started = time.monotonic()
+        try:
+            step()
+        except Exception as e:
+            _state["errors"][name] = str(e)
+            if attempt > WARMUP_RETRIES:
+                logger.exception("Warm-up step %s failed after %d attempts", name, attempt)
+                return
+            logger.warning("Warm-up step %s failed (attempt %d), retrying in %.0fs: %s", name, attempt, delay, e)
+            time.sleep(delay)
+            delay *= 2
+        else:
+            _state["errors"].pop(name, None)
+            _state["steps"][name] = round(time.monotonic() - step_started, 3)
+            return
+
+
+def _run() -> None:
+    started = time.monotonic()
+    _state["status"] = "warming"
+    for name, step in WARMUP_STEPS:
+        # Keep going: a broken model shouldn't stop the others from warming
+        _run_step(name, step)
+    _state["seconds"] = round(time.monotonic() - started, 3)
+    _state["status"] = "degraded" if _state["errors"] else "ready"
+    logger.info("Warm-up %s in %.1fs", _state["status"], _state["seconds"])
+
+
+def start_warmup() -> None:
+    """
+    Start warm-up on a daemon thread; later calls are no-ops.
+    """
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        if not WARMUP_ENABLED:
+            _state["status"] = "skipped"
+            return
+        _thread = threading.Thread(target=_run, name="warmup", daemon=True)
+        _thread.start()
+
+
+def warmup_state() -> dict:
+    return {
+        "status": _state["status"],
+        "steps": dict(_state["steps"]),
+        "errors": dict(_state["errors"]),
+        "seconds": _state["seconds"],
+    }
+
+
+def is_ready() -> bool:
+    # With warm-up switched off, models load on first use and the process is ready at once
+    # Degraded stages load lazily on first use, as they would with warm-up off
+    return _state["status"] in ("ready", "degraded", "skipped")
@@ -1,68 +1,558 @@
+"""
+User and contact storage on SQLite.
+
+The database runs in WAL mode, so readers never block the writer and several
+uvicorn workers can share one file. Every call is an indexed lookup instead
+of a read or rewrite of the whole user base. Each thread opens its own
+connection on first use.
+
+Reads go through an in-process LRU cache with a TTL. Before serving a cached
+user, the calling thread checks SQLite's data_version, which changes whenever
+another connection (another thread or another worker) commits, and drops the
+cache if it moved; local writes also invalidate the user they touch. A contact
+added in one worker is therefore never served stale by another.
+
+The legacy users.json is imported automatically the first time the database
+is created, or explicitly with `python -m backend.storage.user_store --migrate [users.json]`.
+Databases from before contact ids were unique are deduplicated, after exporting
+the rows to be removed, with `--dedupe-contacts [export.json]`.
+"""
+import base64
 import json
+import logging
 import os
-from typing import Dict, Optional
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from backend.utils.metrics import count_cache
+
+logger = logging.getLogger(__name__)
 
 STORAGE_DIR = os.path.join(os.path.dirname(__file__))
-USERS_FILE = os.path.join(STORAGE_DIR, "users.json")
+USERS_FILE = os.path.join(STORAGE_DIR, "users.json")  # legacy store, imported on first start
+DB_FILE = os.environ.get("MESHPE_USER_DB", os.path.join(STORAGE_DIR, "users.db"))
 
+DEFAULT_LANGUAGE = "english"
+BUSY_TIMEOUT_MS = 5000
 
-def _load_raw() -> Dict[str, dict]:
-    if not os.path.exists(USERS_FILE):
-        return {}
+CONTACTS_PAGE_SIZE = 50
+MAX_CONTACTS_PAGE_SIZE = 500
+
+CACHE_SIZE = int(os.environ.get("MESHPE_USER_CACHE_SIZE", "10000"))  # 0 disables the cache
+CACHE_TTL_SECONDS = float(os.environ.get("MESHPE_USER_CACHE_TTL", "30"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id       TEXT PRIMARY KEY,
+    name     TEXT NOT NULL DEFAULT '',
+    phone    TEXT NOT NULL DEFAULT '',
+    language TEXT NOT NULL DEFAULT 'english',
+    contacts_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_users_phone ON users (phone);
+
+CREATE TABLE IF NOT EXISTS contacts (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner_id   TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    name       TEXT NOT NULL,
+    contact_id TEXT NOT NULL
+);
+-- Contacts come back in insertion order; the contact index relies on it.
+CREATE INDEX IF NOT EXISTS idx_contacts_owner ON contacts (owner_id, seq);
+CREATE INDEX IF NOT EXISTS idx_contacts_owner_name ON contacts (owner_id, name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Every write to a user's contacts bumps users.contacts_version, whichever code path
+# (or sqlite3 shell) makes it, so caches built from a contact list can key on it.
+CONTACT_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS contacts_version_insert AFTER INSERT ON contacts BEGIN
+    UPDATE users SET contacts_version = contacts_version + 1 WHERE id = NEW.owner_id;
+END;
+CREATE TRIGGER IF NOT EXISTS contacts_version_update AFTER UPDATE ON contacts BEGIN
+    UPDATE users SET contacts_version = contacts_version + 1 WHERE id IN (OLD.owner_id, NEW.owner_id);
+END;
+CREATE TRIGGER IF NOT EXISTS contacts_version_delete AFTER DELETE ON contacts BEGIN
+    UPDATE users SET contacts_version = contacts_version + 1 WHERE id = OLD.owner_id;
+END;
+"""
+
+# Created separately from SCHEMA: databases from before it may hold duplicates, which
+# only dedupe_contacts() removes.
+UNIQUE_CONTACTS_INDEX = "idx_contacts_owner_contact"
+
+INSERT_CONTACT = "INSERT OR IGNORE INTO contacts (owner_id, name, contact_id) VALUES (?, ?, ?)"
+
+UPSERT_USER = """
+INSERT INTO users (id, name, phone, language) VALUES (?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET name = excluded.name, phone = excluded.phone, language = excluded.language
+"""
+
+# Profile fields left as NULL keep their stored value; a new user gets the insert_* defaults.
+MERGE_USER = """
+INSERT INTO users (id, name, phone, language) VALUES (:id, :insert_name, :insert_phone, :insert_language)
+ON CONFLICT (id) DO UPDATE SET
+    name = COALESCE(:name, name), phone = COALESCE(:phone, phone), language = COALESCE(:language, language)
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialised = set()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == DB_FILE:
+        return conn
+
+    os.makedirs(os.path.dirname(DB_FILE) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Durable across process crashes; only an OS crash can lose the last commits.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    _local.conn, _local.path, _local.data_version = conn, DB_FILE, None
+
+    with _init_lock:
+        if DB_FILE not in _initialised:
+            conn.executescript(SCHEMA)
+            _upgrade_schema(conn)
+            _ensure_unique_contacts(conn)
+            _migrate_once(conn)
+            _initialised.add(DB_FILE)
+    return conn
+
+
+def _upgrade_schema(conn: sqlite3.Connection) -> None:
+    """
+    Bring databases created by earlier versions up to SCHEMA.
+    """
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(users)")}
+    with conn:
+        if "contacts_version" not in columns:
+            conn.execute("ALTER TABLE users ADD COLUMN contacts_version INTEGER NOT NULL DEFAULT 0")
+        conn.executescript(CONTACT_TRIGGERS)
+
+
+DUPLICATE_CONTACTS = """
+SELECT seq, owner_id, name, contact_id FROM contacts
+WHERE seq NOT IN (SELECT MIN(seq) FROM contacts GROUP BY owner_id, contact_id)
+ORDER BY owner_id, seq
+"""
+
+
+def _ensure_unique_contacts(conn: sqlite3.Connection) -> None:
+    """
+    One contact_id per owner, enforced by a unique index so duplicate checks are
+    an index probe. A database from before the index that already holds
+    duplicates is left alone: removing contacts is an explicit `--dedupe-contacts` step.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (UNIQUE_CONTACTS_INDEX,)
+    ).fetchone()
+    if exists:
+        return
+    duplicates = conn.execute(f"SELECT COUNT(*) FROM ({DUPLICATE_CONTACTS})").fetchone()[0]
+    if duplicates:
+        logger.warning(
+            "%d duplicate contacts in %s; repeated contact ids aren't rejected until "
+            "`python -m backend.storage.user_store --dedupe-contacts` is run",
+            duplicates,
+            DB_FILE,
+        )
+        return
+    with conn:
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_CONTACTS_INDEX} ON contacts (owner_id, contact_id)")
+
+
+def dedupe_contacts(export_path: str) -> int:
+    """
+    Keep the first copy of every (owner, contact_id), write the removed rows to
+    export_path as JSON, then create the unique index. Returns how many were removed.
+    """
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        with open(USERS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        duplicates = [dict(row) for row in conn.execute(DUPLICATE_CONTACTS)]
+        if duplicates:
+            # Exported before anything is deleted; a failed write aborts the dedupe
+            with open(export_path, "w", encoding="utf-8") as f:
+                json.dump(duplicates, f, indent=2)
+            conn.executemany("DELETE FROM contacts WHERE seq = ?", [(d["seq"],) for d in duplicates])
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_CONTACTS_INDEX} ON contacts (owner_id, contact_id)")
+        conn.commit()
     except Exception:
-        return {}
+        conn.rollback()
+        raise
+    _cache.invalidate()
+    return len(duplicates)
+
+
+def _user_row_to_dict(row: sqlite3.Row) -> dict:
+    return {"id": row["id"], "name": row["name"], "phone": row["phone"], "language": row["language"]}
+
+
+def _contacts(conn: sqlite3.Connection, user_id: str) -> List[dict]:
+    rows = conn.execute("SELECT name, contact_id FROM contacts WHERE owner_id = ? ORDER BY seq", (user_id,))
+    return [{"name": r["name"], "id": r["contact_id"]} for r in rows]
+
+
+def _ensure_user(conn: sqlite3.Connection, user_id: str) -> None:
+    conn.execute("INSERT OR IGNORE INTO users (id, language) VALUES (?, ?)", (user_id, DEFAULT_LANGUAGE))
+
+
+def _load_user(conn: sqlite3.Connection, user_id: str) -> Optional[dict]:
+    row = conn.execute(
+        "SELECT id, name, phone, language, contacts_version FROM users WHERE id = ?", (user_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    user = _user_row_to_dict(row)
+    # Cache-internal; get_user() strips it, contacts_with_version() hands it out
+    user["contacts_version"] = row["contacts_version"]
+    contacts = _contacts(conn, user_id)
+    if contacts:
+        user["contacts"] = contacts
+    return user
+
+
+# ----- read-through cache -----
+
+
+class _UserCache:
+    """
+    LRU of user_id -> user dict (contacts included, None for unknown users).
+
+    Every invalidation bumps a generation number. A load that started before an
+    invalidation is not stored, so a read racing a write can't re-cache the old row.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Tuple[bool, Optional[dict], int]:
+        """
+        (found, user, generation); pass the generation back to put() after a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return True, entry[1], self._generation
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return False, None, self._generation
+
+    def put(self, user_id: str, user: Optional[dict], generation: int) -> None:
+        with self._lock:
+            if generation != self._generation or self.size <= 0:
+                return
+            self._entries[user_id] = (time.monotonic(), user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids=None) -> None:
+        """
+        Drop the given users, or everything when user_ids is None.
+        """
+        with self._lock:
+            self._generation += 1
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
 
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
 
-def _save_raw(data: Dict[str, dict]) -> None:
-    os.makedirs(STORAGE_DIR, exist_ok=True)
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+
+_cache = _UserCache()
+
+
+def _sync_cache(conn: sqlite3.Connection) -> None:
+    """
+    Drop the cache if another connection has committed since this thread last looked.
+    data_version is kept in shared memory by WAL, so the check doesn't touch any table.
+    """
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if version != _local.data_version:
+        _cache.invalidate()
+        _local.data_version = version
+
+
+def _cached_user(user_id: str) -> Optional[dict]:
+    conn = _connect()
+    _sync_cache(conn)
+    found, user, generation = _cache.get(user_id)
+    count_cache("user", "hit" if found else "miss")
+    if not found:
+        user = _load_user(conn, user_id)
+        _cache.put(user_id, user, generation)
+    return user
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
 
 
 def get_user(user_id: str) -> Optional[dict]:
-    users = _load_raw()
-    return users.get(user_id)
+    user = _cached_user(user_id)
+    if user is None:
+        return None
+    # Callers get their own copy; the cached dict stays untouched
+    user = dict(user)
+    user.pop("contacts_version", None)
+    if "contacts" in user:
+        user["contacts"] = list(user["contacts"])
+    return user
 
 
 def create_or_update_user(user_id: str, name: str, phone: str, language: str) -> dict:
-    users = _load_raw()
-    user = users.get(user_id, {})
-    user.update(
+    conn = _connect()
+    with conn:
+        conn.execute(UPSERT_USER, (user_id, name, phone, language))
+    _cache.invalidate([user_id])
+    return get_user(user_id)
+
+
+def merge_users(records: List[dict], language: str = DEFAULT_LANGUAGE) -> int:
+    """
+    Bulk insert or partial update, in one transaction. Each record has an id and any
+    of name, phone and language. Existing users only get the fields a record carries;
+    new users default to name = phone = id and the given language.
+    """
+    rows = [
         {
-            "id": user_id,
-            "name": name,
-            "phone": phone,
-            "language": language,
+            "id": r["id"],
+            "name": r.get("name"),
+            "phone": r.get("phone"),
+            "language": r.get("language"),
+            "insert_name": r.get("name") or r["id"],
+            "insert_phone": r.get("phone") or r["id"],
+            "insert_language": r.get("language") or language,
         }
-    )
-    users[user_id] = user
-    _save_raw(users)
-    return user
+        for r in records
+    ]
+    conn = _connect()
+    with conn:
+        conn.executemany(MERGE_USER, rows)
+    _cache.invalidate([r["id"] for r in records])
+    return len(records)
 
 
 def list_contacts(user_id: str):
-    users = _load_raw()
-    user = users.get(user_id) or {}
-    return user.get("contacts", [])
+    user = _cached_user(user_id)
+    return list(user.get("contacts", [])) if user else []
+
+
+def contacts_with_version(user_id: str) -> Tuple[int, List[dict]]:
+    """
+    (contacts_version, contacts) read together, for caches derived from the list.
+    The version changes on every insert, update or delete of the user's contacts.
+    """
+    user = _cached_user(user_id)
+    if not user:
+        return 0, []
+    return user["contacts_version"], list(user.get("contacts", []))
+
+
+def get_contact(user_id: str, contact_id: str) -> Optional[dict]:
+    """
+    The user's contact with this id, as {"name", "id"}, or None.
+    """
+    row = _connect().execute(
+        "SELECT name, contact_id FROM contacts WHERE owner_id = ? AND contact_id = ?", (user_id, contact_id)
+    ).fetchone()
+    return {"name": row["name"], "id": row["contact_id"]} if row else None
 
 
 def add_contact(user_id: str, contact_name: str, contact_id: str):
-    users = _load_raw()
-    user = users.setdefault(
-        user_id,
-        {
-            "id": user_id,
-            "name": "",
-            "phone": "",
-            "language": "english",
-        },
-    )
-    contacts = user.setdefault("contacts", [])
-    contacts.append({"name": contact_name, "id": contact_id})
-    _save_raw(users)
-    return contacts
+    """
+    Append a contact (a contact_id the user already has is left as it is)
+    and return the full list.
+    """
+    add_contacts(user_id, [{"name": contact_name, "id": contact_id}])
+    return _contacts(_connect(), user_id)
+
+
+def add_contacts(user_id: str, contacts: List[dict]) -> dict:
+    """
+    Append {"name", "id"} contacts in one transaction, skipping ids the user already
+    has (or that repeat within the batch). Returns {"added": n, "duplicates": [ids]}.
+    """
+    conn = _connect()
+    duplicates = []
+    with conn:
+        _ensure_user(conn, user_id)
+        for contact in contacts:
+            if conn.execute(INSERT_CONTACT, (user_id, contact["name"], contact["id"])).rowcount == 0:
+                duplicates.append(contact["id"])
+    added = len(contacts) - len(duplicates)
+    if added:
+        _cache.invalidate([user_id])
+    return {"added": added, "duplicates": duplicates}
+
+
+def _encode_cursor(key: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, size: int) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        key = None
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def page_contacts(
+    user_id: str, limit: int = CONTACTS_PAGE_SIZE, cursor: Optional[str] = None, prefix: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of a user's contacts and the cursor for the next page (None on the last).
+
+    Without a prefix, contacts come in insertion order; with one, only contacts whose
+    name starts with it (case-insensitively), in name order. Both walk an index from
+    the cursor position, so every page costs the same however deep it is.
+    Raises ValueError for a cursor this function didn't produce.
+    """
+    limit = max(1, min(limit, MAX_CONTACTS_PAGE_SIZE))
+    conn = _connect()
+    if prefix:
+        sql = (
+            "SELECT seq, name, contact_id FROM contacts WHERE owner_id = ?"
+            " AND name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE"
+        )
+        # chr(0x10FFFF) sorts after every character, closing the prefix range
+        params: list = [user_id, prefix, prefix + chr(0x10FFFF)]
+        if cursor:
+            name, seq = _decode_cursor(cursor, 2)
+            sql += " AND (name > ? COLLATE NOCASE OR (name = ? COLLATE NOCASE AND seq > ?))"
+            params += [name, name, seq]
+        sql += " ORDER BY name COLLATE NOCASE, seq LIMIT ?"
+    else:
+        sql = "SELECT seq, name, contact_id FROM contacts WHERE owner_id = ?"
+        params = [user_id]
+        if cursor:
+            (seq,) = _decode_cursor(cursor, 1)
+            sql += " AND seq > ?"
+            params.append(seq)
+        sql += " ORDER BY seq LIMIT ?"
+    # One row past the page tells whether there is a next one
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor([last["name"], last["seq"]] if prefix else [last["seq"]])
+    return [{"name": r["name"], "id": r["contact_id"]} for r in rows], next_cursor
+
+
+# ----- migration from users.json -----
+
+
+def _load_json(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def migrate_from_json(path: str = USERS_FILE) -> int:
+    """
+    Import users and contacts from a users.json store. Users already in the
+    database are updated; new contacts are appended in their original order.
+    Returns the number of users imported.
+    """
+    conn = _connect()
+    imported = _import_json(conn, _load_json(path))
+    _cache.invalidate()
+    return imported
+
+
+def _insert_json(conn: sqlite3.Connection, users: Dict[str, dict]) -> None:
+    for user_id, user in users.items():
+        conn.execute(
+            UPSERT_USER,
+            (
+                user_id,
+                user.get("name", ""),
+                user.get("phone", ""),
+                user.get("language", DEFAULT_LANGUAGE),
+            ),
+        )
+        conn.executemany(
+            INSERT_CONTACT,
+            [(user_id, c.get("name", ""), c.get("id", "")) for c in user.get("contacts", [])],
+        )
+
+
+def _import_json(conn: sqlite3.Connection, users: Dict[str, dict]) -> int:
+    with conn:
+        _insert_json(conn, users)
+    return len(users)
+
+
+def _migrate_once(conn: sqlite3.Connection) -> None:
+    """
+    Import the legacy JSON store the first time this database is opened.
+    BEGIN IMMEDIATE makes concurrent workers wait, so exactly one of them imports,
+    and the import and its marker commit together.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        users = {}
+        if done is None:
+            users = _load_json(USERS_FILE)
+            _insert_json(conn, users)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (USERS_FILE,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if users:
+        logger.info("Imported %d users from %s", len(users), USERS_FILE)
+
 
+if __name__ == "__main__":
+    import argparse
 
+    parser = argparse.ArgumentParser(description="MeshPe user store maintenance")
+    parser.add_argument("--migrate", nargs="?", const=USERS_FILE, metavar="USERS_JSON",
+                        help="import a users.json store (default: the legacy one next to this file)")
+    parser.add_argument("--dedupe-contacts", nargs="?", const=DB_FILE + ".duplicates.json", metavar="EXPORT_JSON",
+                        help="remove repeated contact ids, saving the removed rows to EXPORT_JSON first")
+    args = parser.parse_args()
+    if args.migrate:
+        print(f"Imported {migrate_from_json(args.migrate)} users from {args.migrate} into {DB_FILE}")
+    elif args.dedupe_contacts:
+        removed = dedupe_contacts(args.dedupe_contacts)
+        print(f"Removed {removed} duplicate contacts from {DB_FILE}" + (f", saved to {args.dedupe_contacts}" if removed else ""))
+    else:
+        parser.print_help()
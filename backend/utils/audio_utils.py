@@ -1,9 +1,87 @@
 import io
-from typing import Tuple
+import logging
+from functools import lru_cache
+from math import gcd
+from typing import Optional, Tuple
 
 import numpy as np
 import soundfile as sf
-import av  # PyAV - robust container/codec support (e.g. webm/opus)
+from backend.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+
+# Leading bytes of the formats libsndfile can read. Anything else (notably the
+# webm/opus MediaRecorder uploads) goes straight to PyAV.
+SOUNDFILE_SIGNATURES = (b"RIFF", b"RIFX", b"fLaC", b"OggS", b"FORM")
+
+
+@lru_cache(maxsize=32)
+def _polyphase_filter(src_sr: int, dst_sr: int) -> Tuple[int, int, np.ndarray]:
+    """
+    Anti-aliasing FIR design for one (src_sr, dst_sr) pair, as scipy's resample_poly
+    would design it on every call (Kaiser window, beta 5.0).
+    """
+    import scipy.signal
+
+    g = gcd(src_sr, dst_sr)
+    up, down = dst_sr // g, src_sr // g
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = scipy.signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)).astype(np.float32)
+    h.setflags(write=False)
+    return up, down, h
+
+
+def resample(audio: np.ndarray, src_sr: int, dst_sr: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    Resample mono audio with rational polyphase filtering.
+
+    Unlike FFT resampling, the cost only depends on the clip length and the rate
+    ratio, not on how the sample count factorises.
+    """
+    import scipy.signal
+
+    audio = np.asarray(audio, dtype=np.float32)
+    if src_sr == dst_sr or not len(audio):
+        return audio
+
+    with timed("resample"):
+        up, down, h = _polyphase_filter(int(src_sr), int(dst_sr))
+        return scipy.signal.resample_poly(audio, up, down, window=h).astype(np.float32, copy=False)
+
+
+# Energy VAD: a frame is speech if it is above an absolute floor and within
+# VAD_RELATIVE_DB of the clip's loudest frame.
+VAD_FRAME_MS = 20
+VAD_FLOOR_DB = -50.0
+VAD_RELATIVE_DB = -35.0
+VAD_PAD_MS = 150
+
+
+def detect_speech(audio: np.ndarray, sr: int) -> Tuple[int, int, float]:
+    """
+    Find the span of a clip that contains speech.
+    Returns (start, end) sample offsets, padded by VAD_PAD_MS, and the seconds of voiced frames.
+    (0, 0, 0.0) means no speech was found.
+    """
+    frame = max(1, sr * VAD_FRAME_MS // 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return 0, 0, 0.0
+
+    frames = np.asarray(audio[: n_frames * frame], dtype=np.float32).reshape(n_frames, frame)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    threshold = max(VAD_FLOOR_DB, float(energy_db.max()) + VAD_RELATIVE_DB)
+    voiced = np.flatnonzero(energy_db > threshold)
+    if not len(voiced):
+        return 0, 0, 0.0
+
+    pad = sr * VAD_PAD_MS // 1000
+    start = max(0, int(voiced[0]) * frame - pad)
+    end = min(len(audio), (int(voiced[-1]) + 1) * frame + pad)
+    return start, end, len(voiced) * frame / sr
 
 
 def _load_with_soundfile(data: bytes) -> Tuple[np.ndarray, int]:
@@ -13,75 +91,278 @@ def _load_with_soundfile(data: bytes) -> Tuple[np.ndarray, int]:
     return audio, sr
 
 
-def _load_with_pyav(data: bytes) -> Tuple[np.ndarray, int]:
+def _is_soundfile_format(data: bytes) -> bool:
+    return data[:4] in SOUNDFILE_SIGNATURES
+
+
+def _estimate_samples(container, stream, target_sr: int) -> int:
+    import av
+
+    if stream.duration is not None and stream.time_base is not None:
+        return int(stream.duration * stream.time_base * target_sr) + target_sr
+    if container.duration is not None:
+        return int(container.duration / av.time_base * target_sr) + target_sr
+    # MediaRecorder webm carries no duration; start with 10 s and grow.
+    return 10 * target_sr
+
+
+def _load_with_pyav(data: bytes, target_sr: int = TARGET_SAMPLE_RATE) -> Tuple[np.ndarray, int]:
     """
-    Fallback loader using PyAV for formats soundfile can't handle (e.g. audio/webm).
-    Returns mono float32 numpy array and samplerate.
+    Decode formats soundfile can't handle (e.g. audio/webm) straight from memory.
+    PyAV's resampler converts to mono float32 at target_sr, written into one buffer.
     """
-    import tempfile
-    import os
-    
-    # Write to a temporary file to ensure PyAV can probe/seek correctly
-    with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
+    # PyAV - robust container/codec support (e.g. webm/opus); imported on first decode
+    import av
 
-    try:
-        frames = []
-        sr = 48000 # Default fallback
-        
-        with av.open(tmp_path) as container:
-            audio_stream = next((s for s in container.streams if s.type == "audio"), None)
-            if audio_stream is None:
-                raise RuntimeError("No audio stream found in container")
+    with av.open(io.BytesIO(data)) as container:
+        audio_stream = next((s for s in container.streams if s.type == "audio"), None)
+        if audio_stream is None:
+            raise RuntimeError("No audio stream found in container")
 
-            sr = audio_stream.rate
-            print(f"PyAV stream detected: {audio_stream.codec_context.name}, rate={sr}")
+        logger.debug("PyAV stream detected: %s, rate=%s", audio_stream.codec_context.name, audio_stream.rate)
 
-            for frame in container.decode(audio_stream):
-                frame_arr = frame.to_ndarray()
-                # PyAV often returns (channels, samples) for planar formats (like fltp).
-                # We want (samples, channels) for concatenation.
-                if frame_arr.ndim == 2 and frame_arr.shape[0] < frame_arr.shape[1]:
-                    frame_arr = frame_arr.T
-                frames.append(frame_arr)
-            
-        print(f"PyAV decoded {len(frames)} frames")
-
-        if not frames:
-            raise RuntimeError("No audio frames decoded")
-
-        audio = np.concatenate(frames, axis=0)
-        
-        if audio.ndim == 1:
-            mono = audio
-        else:
-            mono = audio.mean(axis=1)
-            
-        return mono.astype("float32"), sr
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=target_sr)
+        out = np.empty(_estimate_samples(container, audio_stream, target_sr), dtype=np.float32)
+        n = 0
 
+        def _append(frames):
+            nonlocal out, n
+            for frame in frames:
+                samples = frame.to_ndarray().reshape(-1)
+                if n + len(samples) > len(out):
+                    grown = np.empty(max(2 * len(out), n + len(samples)), dtype=np.float32)
+                    grown[:n] = out[:n]
+                    out = grown
+                out[n:n + len(samples)] = samples
+                n += len(samples)
 
+        for frame in container.decode(audio_stream):
+            _append(resampler.resample(frame))
+        # Flush samples still buffered inside the resampler
+        _append(resampler.resample(None))
+
+    if n == 0:
+        raise RuntimeError("No audio frames decoded")
+
+    return out[:n], target_sr
+
+
+@timed("decode")
 def load_audio_mono_from_bytes(data: bytes) -> Tuple[np.ndarray, int]:
     """
     Load audio bytes into a mono float32 numpy array and samplerate.
-    Tries soundfile first; if that fails (e.g. for webm/opus), falls back to PyAV.
+    WAV/FLAC/OGG/AIFF go through soundfile at their native rate; everything else
+    (and anything soundfile rejects) is decoded by PyAV directly to 16 kHz.
 
     Frontend currently records audio using MediaRecorder with mime-type 'audio/webm'
-    (see frontend/src/utils/audioUtils.ts). soundfile often can't decode webm/opus,
-    so this fallback is required.
-    """
-    try:
-        print("Attempting to load with soundfile...")
-        audio, sr = _load_with_soundfile(data)
-        print(f"Soundfile success: {audio.shape} @ {sr}")
-        return audio, sr
-    except Exception as e:
-        print(f"Soundfile failed: {e}")
-        print("Attempting to load with PyAV...")
-        audio, sr = _load_with_pyav(data)
-        print(f"PyAV success: {audio.shape} @ {sr}")
-        return audio, sr
+    (see frontend/src/utils/audioUtils.ts), which soundfile can't decode, so those
+    uploads skip the soundfile attempt entirely.
+    """
+    if _is_soundfile_format(data):
+        try:
+            audio, sr = _load_with_soundfile(data)
+            logger.debug("Soundfile success: %s @ %s", audio.shape, sr)
+            return audio, sr
+        except Exception as e:
+            logger.warning("Soundfile failed, falling back to PyAV: %s", e)
+
+    audio, sr = _load_with_pyav(data)
+    logger.debug("PyAV success: %s @ %s", audio.shape, sr)
+    return audio, sr
+
+
+PCM_FORMATS = {"pcm_s16le": np.int16, "pcm_f32le": np.float32}
+
+
+def _frames_to_mono(frames) -> np.ndarray:
+    """
+    Mono float32 samples from decoded PyAV audio frames.
+    """
+    arrays = []
+    for frame in frames:
+        frame_arr = frame.to_ndarray()
+        if frame_arr.ndim == 2 and frame_arr.shape[0] < frame_arr.shape[1]:
+            frame_arr = frame_arr.T
+        arrays.append(frame_arr)
+    if not arrays:
+        return np.zeros(0, dtype=np.float32)
+
+    audio = np.concatenate(arrays, axis=0)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return audio.astype("float32")
+
+
+def _decode_available(data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Decode as much of a (possibly truncated) container as PyAV can read.
+    Returns mono float32 samples and samplerate.
+    """
+    import av
+
+    frames = []
+    with av.open(io.BytesIO(data)) as container:
+        audio_stream = next((s for s in container.streams if s.type == "audio"), None)
+        if audio_stream is None:
+            raise RuntimeError("No audio stream found in container")
+        sr = audio_stream.rate
+
+        try:
+            for frame in container.decode(audio_stream):
+                frames.append(frame)
+        except av.error.FFmpegError:
+            # The tail of a stream that is still arriving is usually incomplete.
+            pass
+
+    return _frames_to_mono(frames), sr
+
+
+def _without_side_data(packet):
+    import av
+
+    copy = av.Packet(bytes(packet))
+    copy.pts, copy.dts, copy.duration, copy.time_base = packet.pts, packet.dts, packet.duration, packet.time_base
+    return copy
+
+
+# Matroska/WebM Cluster element id. A cluster holds a run of complete packets, so
+# the stream header plus one cluster is a demuxable file on its own.
+MATROSKA_CLUSTER_ID = b"\x1f\x43\xb6\x75"
+CLUSTERED_FORMATS = {"webm", "matroska", "mkv"}
+
+
+class StreamingDecoder:
+    """
+    Incrementally decodes audio that arrives in chunks (e.g. over a WebSocket).
+
+    Raw PCM chunks ("pcm_s16le" / "pcm_f32le") are converted as they arrive.
+    Container formats such as MediaRecorder's webm/opus can't be demuxed chunk by
+    chunk (only the first chunk carries the header). For webm, the header is kept
+    and only the cluster still being received is demuxed again behind it; a cluster
+    is dropped once the next one starts. New packets go to one decoder that lives
+    as long as the stream, so the work per chunk is bounded by the cluster length.
+    Other containers are re-demuxed from the start and only samples past those
+    already returned are emitted.
+    """
+
+    def __init__(self, fmt: str = "webm", samplerate: Optional[int] = None):
+        if fmt in PCM_FORMATS and not samplerate:
+            raise ValueError(f"sample_rate is required for {fmt}")
+        self.format = fmt
+        self.samplerate = samplerate
+        self.bytes_received = 0
+        self._buffer = bytearray()
+        self._emitted = 0
+        # webm: bytes before the first cluster, the decoder, and the last packet fed to it
+        self._header: Optional[bytes] = None
+        self._codec = None
+        self._decoded_pts = None
+        self._held = None
+
+    def feed(self, chunk: bytes) -> np.ndarray:
+        """
+        Add a chunk and return the newly decodable mono float32 samples.
+        """
+        self.bytes_received += len(chunk)
+        self._buffer.extend(chunk)
+
+        if self.format in PCM_FORMATS:
+            dtype = np.dtype(PCM_FORMATS[self.format])
+            usable = len(self._buffer) - len(self._buffer) % dtype.itemsize
+            samples = np.frombuffer(bytes(self._buffer[:usable]), dtype=dtype)
+            del self._buffer[:usable]
+            if dtype == np.int16:
+                return samples.astype(np.float32) / 32768.0
+            return samples.astype(np.float32)
+
+        if self.format in CLUSTERED_FORMATS:
+            return self._feed_clusters()
+        return self._decode_new(bytes(self._buffer))
+
+    def flush(self) -> np.ndarray:
+        """
+        Samples still held back once the last chunk has arrived.
+        """
+        if self.format in PCM_FORMATS or self._codec is None:
+            return np.zeros(0, dtype=np.float32)
+        frames = []
+        if self._held is not None:
+            frames += self._codec.decode(self._held)
+            self._held = None
+        frames += self._codec.decode(None)
+        return _frames_to_mono(frames)
+
+    def _decode_new(self, data: bytes) -> np.ndarray:
+        """
+        Decode data from the start and return the samples past the first self._emitted.
+        """
+        import av
+
+        try:
+            audio, sr = _decode_available(data)
+        except av.error.FFmpegError:
+            # Not enough bytes yet to even probe the container.
+            return np.zeros(0, dtype=np.float32)
+
+        self.samplerate = sr
+        new = audio[self._emitted:]
+        self._emitted = max(self._emitted, len(audio))
+        return new
+
+    def _feed_clusters(self) -> np.ndarray:
+        if self._header is None:
+            first = self._buffer.find(MATROSKA_CLUSTER_ID)
+            if first < 0:
+                return np.zeros(0, dtype=np.float32)
+            self._header = bytes(self._buffer[:first])
+            del self._buffer[:first]
+
+        frames = []
+        # A cluster followed by another is complete: decode the rest of it and drop it
+        end = self._buffer.find(MATROSKA_CLUSTER_ID, len(MATROSKA_CLUSTER_ID))
+        while end > 0:
+            frames += self._decode_packets(self._header + bytes(self._buffer[:end]), complete=True)
+            del self._buffer[:end]
+            end = self._buffer.find(MATROSKA_CLUSTER_ID, len(MATROSKA_CLUSTER_ID))
+        frames += self._decode_packets(self._header + bytes(self._buffer), complete=False)
+        return _frames_to_mono(frames)
+
+    def _decode_packets(self, data: bytes, complete: bool) -> list:
+        """
+        Demux data and decode the packets after the last one decoded. The newest packet
+        of an incomplete cluster may itself be cut short, so it is held back until the
+        next packet (or flush) shows it was whole.
+        """
+        import av
+
+        frames = []
+        try:
+            with av.open(io.BytesIO(data)) as container:
+                stream = next((s for s in container.streams if s.type == "audio"), None)
+                if stream is None:
+                    raise RuntimeError("No audio stream found in container")
+                if self._codec is None:
+                    self._codec = av.CodecContext.create(stream.codec_context.name, "r")
+                    self._codec.extradata = stream.codec_context.extradata
+                    self.samplerate = stream.rate
+                resumed = self._decoded_pts is not None
+                for i, packet in enumerate(container.demux(stream)):
+                    if packet.size == 0 or packet.pts is None:
+                        continue
+                    if resumed and packet.pts <= self._decoded_pts:
+                        continue
+                    if resumed and i == 0:
+                        # The demuxer marks the first packet it reads with the codec's
+                        # start-of-stream skip, which doesn't apply mid-stream
+                        packet = _without_side_data(packet)
+                    if self._held is not None:
+                        frames += self._codec.decode(self._held)
+                    self._held, self._decoded_pts = packet, packet.pts
+        except av.error.FFmpegError:
+            # Too few bytes to probe, or the cut-off tail of the cluster being received
+            pass
 
+        if complete and self._held is not None:
+            frames += self._codec.decode(self._held)
+            self._held = None
+        return frames
@@ -0,0 +1,262 @@
+"""
+Binary wire format for sealed packets on the mesh.
+
+JSON with hex fields doubles every byte of key material and ciphertext; over
+BLE, airtime is the bottleneck. A frame carries the same sealed packet as raw
+bytes behind a small header:
+
+    magic "MP" | frame version u8 | kind u8 | flags u8 | ttl u16 | timestamp i64 (µs)
+    | packet_id (16 raw bytes if FLAG_UUID_ID, else u8 length + UTF-8) | body length u32 | body
+
+All integers are big-endian. The header is everything a relay needs: it checks
+the length, decrements ttl in place and forwards the bytes untouched, without
+decoding the body it can't read anyway.
+
+Bodies by kind (see encryption_service for the sealing schemes):
+    KIND_RSA            u16 len + encrypted_key | iv (12) | tag (16) | ciphertext
+    KIND_X25519         epk (32) | tag (16) | ciphertext
+    KIND_BATCH_RSA      u16 len + encrypted_key | u32 count | records
+    KIND_BATCH_X25519   epk (32) | u32 count | records
+    record              u32 n | packet_id | timestamp i64 | tag (16) | u32 len + ciphertext
+
+Only the standard library is used, so relay scripts can import this on their own.
+"""
+import struct
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+FRAME_MAGIC = b"MP"
+FRAME_VERSION = 1
+
+KIND_RSA = 1
+KIND_X25519 = 2
+KIND_BATCH_RSA = 3
+KIND_BATCH_X25519 = 4
+
+FLAG_UUID_ID = 0x01
+
+DEFAULT_TTL = 8  # relay hops before a frame is dropped
+
+HEADER = struct.Struct(">2sBBBHq")
+BODY_LENGTH = struct.Struct(">I")
+TTL_OFFSET = 5  # byte offset of ttl in HEADER
+IV_BYTES = 12
+TAG_BYTES = 16
+EPK_BYTES = 32
+
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+_I64 = struct.Struct(">q")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class FrameError(ValueError):
+    pass
+
+
+def is_frame(data: bytes) -> bool:
+    return data[:2] == FRAME_MAGIC
+
+
+# ----- field helpers -----
+
+
+def _timestamp_to_us(timestamp) -> int:
+    """
+    Packet timestamps are ISO-8601 strings; anything unparseable becomes 0.
+    """
+    try:
+        dt = datetime.fromisoformat(str(timestamp))
+    except ValueError:
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _us_to_timestamp(us: int) -> str:
+    return datetime.fromtimestamp(us / 1_000_000, tz=timezone.utc).isoformat()
+
+
+def _pack_id(packet_id: str) -> Tuple[int, bytes]:
+    """
+    (flags, encoded id): canonical UUID strings travel as 16 raw bytes.
+    """
+    try:
+        parsed = uuid.UUID(packet_id)
+        if str(parsed) == packet_id:
+            return FLAG_UUID_ID, parsed.bytes
+    except (ValueError, AttributeError, TypeError):
+        pass
+    raw = str(packet_id).encode("utf-8")
+    if len(raw) > 255:
+        raise FrameError("packet_id longer than 255 bytes")
+    return 0, bytes([len(raw)]) + raw
+
+
+class _Reader:
+    def __init__(self, data: bytes, offset: int = 0):
+        self.data = memoryview(data)
+        self.offset = offset
+
+    def take(self, n: int) -> bytes:
+        if self.offset + n > len(self.data):
+            raise FrameError("Truncated frame")
+        chunk = bytes(self.data[self.offset:self.offset + n])
+        self.offset += n
+        return chunk
+
+    def unpack(self, fmt: struct.Struct):
+        return fmt.unpack(self.take(fmt.size))
+
+    def packet_id(self, flags: int) -> str:
+        if flags & FLAG_UUID_ID:
+            return str(uuid.UUID(bytes=self.take(16)))
+        (length,) = self.take(1)
+        return self.take(length).decode("utf-8")
+
+    def rest(self) -> bytes:
+        return self.take(len(self.data) - self.offset)
+
+
+# ----- encoding -----
+
+
+def _key_material(sealed: dict) -> bytes:
+    if sealed.get("v", 1) == 2:
+        epk = bytes.fromhex(sealed["epk"])
+        if len(epk) != EPK_BYTES:
+            raise FrameError("X25519 ephemeral key must be 32 bytes")
+        return epk
+    encrypted_key = bytes.fromhex(sealed["encrypted_key"])
+    return _U16.pack(len(encrypted_key)) + encrypted_key
+
+
+def _encode_body(sealed: dict) -> Tuple[int, bytes]:
+    x25519 = sealed.get("v", 1) == 2
+    if "records" in sealed:
+        parts = [_key_material(sealed), _U32.pack(len(sealed["records"]))]
+        for record in sealed["records"]:
+            flags, packet_id = _pack_id(record["packet_id"])
+            ciphertext = bytes.fromhex(record["ciphertext"])
+            parts += [
+                _U32.pack(record["n"]),
+                bytes([flags]),
+                packet_id,
+                _I64.pack(_timestamp_to_us(record["timestamp"])),
+                bytes.fromhex(record["tag"]),
+                _U32.pack(len(ciphertext)),
+                ciphertext,
+            ]
+        return (KIND_BATCH_X25519 if x25519 else KIND_BATCH_RSA), b"".join(parts)
+
+    tag = bytes.fromhex(sealed["tag"])
+    ciphertext = bytes.fromhex(sealed["ciphertext"])
+    if x25519:
+        return KIND_X25519, _key_material(sealed) + tag + ciphertext
+    return KIND_RSA, _key_material(sealed) + bytes.fromhex(sealed["iv"]) + tag + ciphertext
+
+
+def encode_frame(sealed: dict, ttl: int = DEFAULT_TTL) -> bytes:
+    """
+    Frame for a sealed packet or batch, as produced by encryption_service.
+    """
+    kind, body = _encode_body(sealed)
+    # A batch has no id of its own; its header carries the first record's
+    first = sealed["records"][0] if sealed.get("records") else sealed
+    flags, packet_id = _pack_id(first.get("packet_id", ""))
+    header = HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, kind, flags, max(0, min(ttl, 0xFFFF)), _timestamp_to_us(first.get("timestamp"))
+    )
+    return header + packet_id + BODY_LENGTH.pack(len(body)) + body
+
+
+# ----- decoding -----
+
+
+def read_header(frame: bytes) -> dict:
+    """
+    Header fields plus body_offset, checking the frame is complete. Doesn't touch the body.
+    """
+    reader = _Reader(frame)
+    magic, version, kind, flags, ttl, timestamp = reader.unpack(HEADER)
+    if magic != FRAME_MAGIC:
+        raise FrameError("Not a mesh frame")
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version: {version}")
+    packet_id = reader.packet_id(flags)
+    (body_length,) = reader.unpack(BODY_LENGTH)
+    if reader.offset + body_length != len(frame):
+        raise FrameError("Frame length doesn't match its body length")
+    return {
+        "kind": kind,
+        "ttl": ttl,
+        "timestamp": _us_to_timestamp(timestamp),
+        "packet_id": packet_id,
+        "body_offset": reader.offset,
+    }
+
+
+def decrement_ttl(frame: bytes) -> Optional[bytes]:
+    """
+    Frame to forward with ttl - 1, or None once the frame has used up its hops.
+    """
+    header = read_header(frame)
+    if header["ttl"] <= 1:
+        return None
+    forwarded = bytearray(frame)
+    _U16.pack_into(forwarded, TTL_OFFSET, header["ttl"] - 1)
+    return bytes(forwarded)
+
+
+def _read_key_material(reader: _Reader, x25519: bool) -> dict:
+    if x25519:
+        return {"v": 2, "epk": reader.take(EPK_BYTES).hex()}
+    (length,) = reader.unpack(_U16)
+    return {"v": 1, "encrypted_key": reader.take(length).hex()}
+
+
+def decode_frame(frame: bytes) -> dict:
+    """
+    The sealed packet or batch dict that mesh_service.decrypt_packet / unseal_batch take.
+    """
+    header = read_header(frame)
+    kind = header["kind"]
+    reader = _Reader(frame, header["body_offset"])
+
+    if kind in (KIND_RSA, KIND_X25519):
+        sealed = _read_key_material(reader, kind == KIND_X25519)
+        if kind == KIND_RSA:
+            sealed["iv"] = reader.take(IV_BYTES).hex()
+        sealed["tag"] = reader.take(TAG_BYTES).hex()
+        sealed["ciphertext"] = reader.rest().hex()
+        sealed["packet_id"] = header["packet_id"]
+        sealed["timestamp"] = header["timestamp"]
+        return sealed
+
+    if kind in (KIND_BATCH_RSA, KIND_BATCH_X25519):
+        sealed = _read_key_material(reader, kind == KIND_BATCH_X25519)
+        (count,) = reader.unpack(_U32)
+        records = []
+        for _ in range(count):
+            (n,) = reader.unpack(_U32)
+            (flags,) = reader.take(1)
+            packet_id = reader.packet_id(flags)
+            (timestamp,) = reader.unpack(_I64)
+            tag = reader.take(TAG_BYTES)
+            (length,) = reader.unpack(_U32)
+            records.append(
+                {
+                    "n": n,
+                    "packet_id": packet_id,
+                    "timestamp": _us_to_timestamp(timestamp),
+                    "ciphertext": reader.take(length).hex(),
+                    "tag": tag.hex(),
+                }
+            )
+        sealed["records"] = records
+        return sealed
+
+    raise FrameError(f"Unknown frame kind: {kind}")
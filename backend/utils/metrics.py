@@ -0,0 +1,115 @@
+"""
+In-process latency histograms and outcome counters, rendered in the Prometheus
+text exposition format by the /metrics endpoint.
+
+Values are per process and carry no worker label. uvicorn workers share one
+port, so with several workers each scrape reaches an arbitrary one: successive
+scrapes mix different processes' counts and look like counter resets. /metrics
+is only accurate when the API runs as a single worker.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+STAGES = (
+    "decode", "resample", "embed", "identify", "liveness", "stt", "nlp", "contact_match", "encrypt", "mesh_send",
+)
+OUTCOMES = ("verified", "rejected", "liveness_fail", "parse_fail", "no_speech")
+
+# Upper bounds in seconds; covers sub-millisecond parsing up to slow Whisper runs.
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus +Inf; cumulated only when rendering.
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+_stage_histograms: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+_outcomes: Dict[str, int] = {outcome: 0 for outcome in OUTCOMES}
+_cache_lookups: Dict[Tuple[str, str], int] = {}
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    with _lock:
+        hist = _stage_histograms.get(stage)
+        if hist is None:
+            hist = _stage_histograms[stage] = Histogram()
+        hist.observe(seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Record the wall time of the block (or decorated function) under `stage`,
+    whether it returns or raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def count_outcome(outcome: str, n: int = 1) -> None:
+    with _lock:
+        _outcomes[outcome] = _outcomes.get(outcome, 0) + n
+
+
+def count_cache(cache: str, result: str) -> None:
+    """
+    Count a lookup in an in-process cache; result is "hit" or "miss".
+    """
+    with _lock:
+        key = (cache, result)
+        _cache_lookups[key] = _cache_lookups.get(key, 0) + 1
+
+
+def _fmt(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def render_prometheus() -> str:
+    with _lock:
+        histograms = {stage: (list(h.counts), h.sum, h.count, h.buckets) for stage, h in _stage_histograms.items()}
+        outcomes = dict(_outcomes)
+        cache_lookups = dict(_cache_lookups)
+
+    lines = [
+        "# HELP meshpe_stage_duration_seconds Wall time of each payment pipeline stage.",
+        "# TYPE meshpe_stage_duration_seconds histogram",
+    ]
+    for stage, (counts, total, count, buckets) in histograms.items():
+        cumulative = 0
+        for bound, n in zip(buckets + (float("inf"),), counts):
+            cumulative += n
+            lines.append(f'meshpe_stage_duration_seconds_bucket{{stage="{stage}",le="{_fmt(bound)}"}} {cumulative}')
+        lines.append(f'meshpe_stage_duration_seconds_sum{{stage="{stage}"}} {total!r}')
+        lines.append(f'meshpe_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+    lines += [
+        "# HELP meshpe_outcomes_total Verification, liveness and parsing outcomes.",
+        "# TYPE meshpe_outcomes_total counter",
+    ]
+    for outcome, n in outcomes.items():
+        lines.append(f'meshpe_outcomes_total{{outcome="{outcome}"}} {n}')
+
+    lines += [
+        "# HELP meshpe_cache_lookups_total Lookups in in-process caches by result.",
+        "# TYPE meshpe_cache_lookups_total counter",
+    ]
+    for (cache, result), n in sorted(cache_lookups.items()):
+        lines.append(f'meshpe_cache_lookups_total{{cache="{cache}",result="{result}"}} {n}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,13 @@
+"""
+Micro-benchmarks for the hot functions in the payment request path.
+
+Run from the repo root:
+
+    python -m benchmarks.run                 # compare against benchmarks/baselines/local.json
+    python -m benchmarks.run --save          # record a new baseline
+    python -m benchmarks.run --filter decode # only cases whose name contains "decode"
+
+By default the voice encoder and Whisper are replaced by stubs (see
+benchmarks/stubs.py) so the suite runs offline and times our own code around the
+models; pass --models real to include real inference.
+"""
@@ -0,0 +1,68 @@
+"""
+Deterministic synthetic clips shaped like MediaRecorder uploads: silence, a
+voiced stretch (harmonics with syllable-rate amplitude modulation plus breath
+noise), then silence again.
+"""
+import io
+
+import numpy as np
+import soundfile as sf
+
+LEAD_SILENCE_SECONDS = 0.3
+TAIL_SILENCE_SECONDS = 0.3
+
+
+def synth_speech(seconds: float, sr: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+
+    f0 = 140.0 + 20.0 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.5 * (1.0 + np.sin(2 * np.pi * 4.0 * t))
+    signal = 0.25 * voiced * syllables + 0.01 * rng.standard_normal(n)
+
+    lead = int(LEAD_SILENCE_SECONDS * sr)
+    tail = int(TAIL_SILENCE_SECONDS * sr)
+    signal[:lead] = 0.0005 * rng.standard_normal(min(lead, n))
+    if tail:
+        signal[-tail:] = 0.0005 * rng.standard_normal(min(tail, n))
+    return signal.astype(np.float32)
+
+
+def to_wav(audio: np.ndarray, sr: int) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, audio, sr, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def to_webm(audio: np.ndarray, sr: int) -> bytes:
+    """
+    Opus in WebM, as Chrome's MediaRecorder produces. Opus only runs at 48 kHz
+    (and a few lower rates), so other inputs are resampled by the encoder.
+    """
+    import av
+
+    buf = io.BytesIO()
+    with av.open(buf, "w", format="webm") as container:
+        stream = container.add_stream("libopus", rate=48000)
+        stream.layout = "mono"
+        resampler = av.AudioResampler(format="fltp", layout="mono", rate=48000)
+
+        frame = av.AudioFrame.from_ndarray(audio[None, :], format="flt", layout="mono")
+        frame.sample_rate = sr
+        for resampled in resampler.resample(frame) + resampler.resample(None):
+            for packet in stream.encode(resampled):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def encode(audio: np.ndarray, sr: int, fmt: str) -> bytes:
+    if fmt == "wav":
+        return to_wav(audio, sr)
+    if fmt == "webm":
+        return to_webm(audio, sr)
+    raise ValueError(f"Unknown format: {fmt}")
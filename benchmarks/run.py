@@ -0,0 +1,290 @@
+"""
+Benchmark runner: times every case, prints a table and compares against a JSON baseline.
+
+A case regresses when its median is more than --tolerance slower than the
+baseline median and also slower by at least --min-delta-ms, so sub-millisecond
+jitter on tiny functions doesn't fail the run. Any regression exits with status 1;
+a missing baseline exits with status 2 (unless --save is recording it), so a
+misconfigured CI job can't pass without comparing anything. Baselines are
+machine-specific and not committed: see benchmarks/README.md.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from . import audio_fixtures
+from .stubs import install_stub_models, use_temp_bank_keys
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_DELTA_MS = 0.05
+DEFAULT_REPEAT = 7
+# Each timed sample loops a case until it has run for at least this long.
+MIN_SAMPLE_SECONDS = 0.05
+
+DECODE_CLIPS = [
+    # (format, sample rate, seconds)
+    ("wav", 16000, 3),
+    ("wav", 44100, 3),
+    ("wav", 48000, 3),
+    ("wav", 48000, 10),
+    ("webm", 48000, 3),
+    ("webm", 48000, 10),
+]
+MODEL_CLIPS = [(16000, 3), (48000, 3), (48000, 10)]
+# Payments per batch in the crypto.*_batch.* cases
+BATCH_SIZE = 100
+
+NLP_SENTENCES = [
+    "pay simran 100 rupees",
+    "send 250 to rahul sharma",
+    "transfer 1200 rupees for priya",
+    "please pay mom 40",
+]
+
+
+# Contacts in the contact.* cases, and spoken receivers resolved against them
+CONTACT_COUNT = 1000
+CONTACT_FIRST_NAMES = ["asha", "rahul", "simran", "priya", "vikram", "anita", "rohan", "meera", "arjun", "kavya"]
+CONTACT_LAST_NAMES = ["sharma", "verma", "rao", "iyer", "gupta", "nair", "singh", "patel", "reddy", "das"]
+# Exact, phonetic, misspelt, and an ambiguous first name that resolves to None
+CONTACT_QUERIES = ["priya nair 753", "seemran rao 422", "vikrm singh 64", "meera"]
+
+
+def _contacts(n: int) -> List[dict]:
+    return [
+        {
+            "name": f"{CONTACT_FIRST_NAMES[i % 10]} {CONTACT_LAST_NAMES[i // 10 % 10]} {i}",
+            "id": f"ACC{i:06d}",
+        }
+        for i in range(n)
+    ]
+
+
+class Case:
+    def __init__(self, name: str, fn: Callable[[], object]):
+        self.name = name
+        self.fn = fn
+
+
+def build_cases() -> List[Case]:
+    """
+    Every benchmark case; inputs are built once here so only the call itself is timed.
+    """
+    from backend.services.encryption_service import encrypt_packet
+    from backend.services.mesh_service import (
+        _aes_decrypt_packet,
+        _rsa_decrypt_with_bank_private_key,
+        _x25519_decrypt_packet,
+        unseal_batch,
+    )
+    from backend.services.encryption_service import encrypt_batch
+    from backend.utils.mesh_frame import decode_frame, decrement_ttl, encode_frame
+    from backend.services.payment_service import create_packet
+    from backend.utils.audio_utils import load_audio_mono_from_bytes, resample
+    from backend.services.contact_index import ContactIndex
+    from ml.embedding_batcher import embed_utterance
+    from ml.liveness import _extract_features, check_liveness
+    from ml.nlp_parse import extract_action, extract_amount, extract_receiver
+    from ml.stt_whisper import transcribe_and_parse_from_audio_array
+    from resemblyzer import preprocess_wav
+
+    cases: List[Case] = []
+
+    for fmt, sr, seconds in DECODE_CLIPS:
+        data = audio_fixtures.encode(audio_fixtures.synth_speech(seconds, sr), sr, fmt)
+        cases.append(Case(f"decode.{fmt}.{sr // 1000}k.{seconds}s", lambda d=data: load_audio_mono_from_bytes(d)))
+
+    for sr, seconds in MODEL_CLIPS:
+        audio = audio_fixtures.synth_speech(seconds, sr)
+        wav16 = resample(audio, sr, 16000)
+        tag = f"{sr // 1000}k.{seconds}s"
+
+        cases.append(Case(f"embed.{tag}", lambda a=audio, s=sr: embed_utterance(preprocess_wav(a, source_sr=s))))
+        cases.append(Case(f"liveness.features.{tag}", lambda w=wav16: _extract_features(w, 16000)))
+        cases.append(Case(f"liveness.check.{tag}", lambda a=audio, s=sr: check_liveness(a, s)))
+        cases.append(Case(f"stt.transcribe_parse.{tag}", lambda a=audio, s=sr: transcribe_and_parse_from_audio_array(a, s)))
+
+    def _nlp():
+        for text in NLP_SENTENCES:
+            extract_action(text)
+            extract_amount(text)
+            extract_receiver(text)
+
+    cases.append(Case("nlp.extract", _nlp))
+
+    contacts = _contacts(CONTACT_COUNT)
+    contact_index = ContactIndex(contacts)
+
+    def _resolve():
+        for query in CONTACT_QUERIES:
+            contact_index.resolve(query)
+
+    cases.append(Case(f"contact.build.{CONTACT_COUNT}", lambda: ContactIndex(contacts)))
+    cases.append(Case(f"contact.resolve.{CONTACT_COUNT}", _resolve))
+
+    packet = create_packet("u1", "Asha", "ACC001", "Simran", "ACC002", 100, 60)
+    encrypted = encrypt_packet(packet)
+    aes_key = _rsa_decrypt_with_bank_private_key(encrypted["encrypted_key"])
+
+    cases.append(Case("crypto.encrypt_packet", lambda: encrypt_packet(packet)))
+    cases.append(Case("crypto.rsa_decrypt", lambda: _rsa_decrypt_with_bank_private_key(encrypted["encrypted_key"])))
+    cases.append(
+        Case(
+            "crypto.aes_decrypt",
+            lambda: _aes_decrypt_packet(aes_key, encrypted["iv"], encrypted["ciphertext"], encrypted["tag"]),
+        )
+    )
+
+    sealed = encrypt_packet(packet, version=2)
+    cases.append(Case("crypto.encrypt_packet.v2", lambda: encrypt_packet(packet, version=2)))
+    cases.append(
+        Case("crypto.x25519_decrypt", lambda: _x25519_decrypt_packet(sealed["epk"], sealed["ciphertext"], sealed["tag"]))
+    )
+
+    queue = [dict(packet, packet_id=f"{packet['packet_id']}-{i}") for i in range(BATCH_SIZE)]
+    batch = encrypt_batch(queue, version=1)
+    cases.append(Case(f"crypto.encrypt_batch.{BATCH_SIZE}", lambda: encrypt_batch(queue, version=1)))
+    cases.append(Case(f"crypto.unseal_batch.{BATCH_SIZE}", lambda: list(unseal_batch(batch))))
+
+    frame = encode_frame(encrypted)
+    cases.append(Case("wire.encode_frame", lambda: encode_frame(encrypted)))
+    cases.append(Case("wire.decode_frame", lambda: decode_frame(frame)))
+    cases.append(Case("wire.relay_forward", lambda: decrement_ttl(frame)))
+    return cases
+
+
+def time_case(case: Case, repeat: int) -> Dict[str, float]:
+    """
+    Milliseconds per call over `repeat` samples, after one warm-up call.
+    """
+    case.fn()
+
+    start = time.perf_counter()
+    case.fn()
+    once = time.perf_counter() - start
+    number = max(1, int(MIN_SAMPLE_SECONDS / max(once, 1e-9)))
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            case.fn()
+        samples.append(1000 * (time.perf_counter() - start) / number)
+
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "max_ms": round(max(samples), 4),
+        "calls_per_sample": number,
+        "samples": repeat,
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float, min_delta_ms: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        delta = result["median_ms"] - base["median_ms"]
+        if delta > min_delta_ms and result["median_ms"] > base["median_ms"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def _format_row(name: str, result: dict, base: Optional[dict], regressed: bool) -> str:
+    row = f"{name:<32} {result['median_ms']:>10.3f} ms"
+    if base:
+        change = 100.0 * (result["median_ms"] / base["median_ms"] - 1.0) if base["median_ms"] else 0.0
+        row += f"   baseline {base['median_ms']:>10.3f} ms  {change:+7.1f}%"
+        if regressed:
+            row += "  REGRESSION"
+    return row
+
+
+def _environment(models: str) -> dict:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "models": models,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="MeshPe request-path micro-benchmarks")
+    parser.add_argument("--baseline", default="local", help="baseline name in benchmarks/baselines, or a .json path")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS)
+    parser.add_argument("--models", choices=("stub", "real"), default="stub")
+    parser.add_argument("--json", dest="json_out", help="also write the raw results to this file")
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline if args.baseline.endswith(".json") else os.path.join(BASELINE_DIR, f"{args.baseline}.json")
+    if not args.save and not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save to record one", file=sys.stderr)
+        return 2
+
+    if args.models == "stub":
+        install_stub_models()
+    use_temp_bank_keys()
+
+    # The code under test prints on every call; keep that out of the report.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        cases = [c for c in build_cases() if args.filter in c.name]
+
+    baseline: Dict[str, dict] = {}
+    if not args.save:
+        with open(baseline_path) as f:
+            baseline = json.load(f).get("results", {})
+        print(f"Comparing against {baseline_path}")
+
+    results: Dict[str, dict] = {}
+    for case in cases:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results[case.name] = time_case(case, args.repeat)
+        regressed = bool(compare({case.name: results[case.name]}, baseline, args.tolerance, args.min_delta_ms))
+        print(_format_row(case.name, results[case.name], baseline.get(case.name), regressed))
+
+    report = {"environment": _environment(args.models), "results": results}
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save:
+        os.makedirs(os.path.dirname(baseline_path) or ".", exist_ok=True)
+        if os.path.exists(baseline_path) and args.filter:
+            # Partial run: update only the cases that ran
+            with open(baseline_path) as f:
+                merged = json.load(f)
+            merged["results"].update(results)
+            merged["environment"] = report["environment"]
+            report = merged
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {baseline_path}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
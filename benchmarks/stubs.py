@@ -0,0 +1,81 @@
+"""
+Offline stand-ins for the heavy models, installed into ml.model_registry.
+
+They keep the real call contracts (torch in / torch out for the encoder,
+transcribe() -> (segments, info) for Whisper) but do almost no work, so the
+benchmarks measure preprocessing, batching, parsing and glue rather than
+inference. The anti-replay forest is a small local file and always runs for real.
+"""
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+STUB_TRANSCRIPT = " Pay Simran 100 rupees"
+EMBEDDING_SIZE = 256
+MEL_CHANNELS = 40
+
+
+class StubEncoder:
+    """
+    Mean-pools each partial mel window and projects it with a fixed random matrix.
+    """
+
+    device = "cpu"
+
+    def __init__(self, seed: int = 0):
+        import torch
+
+        rng = np.random.default_rng(seed)
+        self._proj = torch.from_numpy(rng.standard_normal((MEL_CHANNELS, EMBEDDING_SIZE)).astype(np.float32))
+
+    def __call__(self, mels):
+        import torch
+
+        embeds = mels.mean(dim=1) @ self._proj
+        return torch.nn.functional.normalize(embeds, dim=1)
+
+
+class StubWhisper:
+    """
+    Returns the same command for every clip, with a confident log-probability.
+    """
+
+    def __init__(self, text: str = STUB_TRANSCRIPT):
+        self.text = text
+
+    def transcribe(self, audio, **options):
+        segment = SimpleNamespace(text=self.text, avg_logprob=-0.1)
+        return [segment], SimpleNamespace(duration=len(audio) / 16000)
+
+    def stats(self) -> dict:
+        return {"stub": True}
+
+
+def install_stub_models() -> None:
+    """
+    Register stubs for the encoder and both Whisper models before anything loads them.
+    """
+    from ml import model_registry
+
+    model_registry._models["encoder"] = StubEncoder()
+    model_registry._models["whisper"] = StubWhisper()
+    model_registry._models["whisper_fast"] = StubWhisper()
+
+
+def use_temp_bank_keys() -> Path:
+    """
+    Point backend.crypto.bank_keys at a throwaway keypair so benchmarking
+    never creates or reads the real bank keys in the repo.
+    """
+    from backend.crypto import bank_keys
+
+    tmp = Path(tempfile.mkdtemp(prefix="meshpe-bench-keys-"))
+    bank_keys.BANK_PRIV_PATH = tmp / "bank_private.pem"
+    bank_keys.BANK_PUB_PATH = tmp / "bank_public.pem"
+    bank_keys.BANK_X25519_PRIV_PATH = tmp / "bank_x25519_private.pem"
+    bank_keys.BANK_X25519_PUB_PATH = tmp / "bank_x25519_public.pem"
+    bank_keys.ensure_bank_keys()
+    bank_keys.ensure_bank_x25519_keys()
+    return tmp
@@ -88,6 +88,9 @@ export function PaymentScreen() {
         formData.append('user_id', user.id);
       }
       formData.append('receiver_name', paymentInfo.receiver_name);
+      if (paymentInfo.receiver_id) {
+        formData.append('receiver_id', paymentInfo.receiver_id);
+      }
       formData.append('amount', String(paymentInfo.amount));
 
       const response = await confirmPayment(formData);
@@ -81,6 +81,7 @@ export async function loginVerify(formData: FormData): Promise<ApiResponse<{ use
 export async function initiatePayment(formData: FormData): Promise<ApiResponse<{
   payment_info: {
     receiver_name: string;
+    receiver_id: string;
     amount: number;
     currency: string;
   };
@@ -139,10 +140,20 @@ export async function addContact(userId: string, contactName: string, contactId:
 
 export async function getContacts(userId: string): Promise<ApiResponse<{ contacts: Array<{ name: string; id: string }> }>> {
   try {
-    const response = await fetchWithCredentials(`/auth/contacts/list?user_id=${encodeURIComponent(userId)}`, {
-      method: 'GET',
-    });
-    return await response.json();
+    // The list endpoint is paginated; follow next_cursor until the last page
+    const contacts: Array<{ name: string; id: string }> = [];
+    let cursor: string | null = null;
+    do {
+      const query = `user_id=${encodeURIComponent(userId)}&limit=500` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+      const response = await fetchWithCredentials(`/auth/contacts/list?${query}`, {
+        method: 'GET',
+      });
+      const page = await response.json();
+      if (!page.success) return page;
+      contacts.push(...page.data.contacts);
+      cursor = page.data.next_cursor;
+    } while (cursor);
+    return { success: true, data: { contacts } };
   } catch (error) {
     return {
       success: false,
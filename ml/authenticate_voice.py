@@ -1,12 +1,24 @@
+import logging
 import os
 import numpy as np
 from numpy.linalg import norm
-from resemblyzer import VoiceEncoder, preprocess_wav
 import random
+from backend.utils.metrics import count_outcome, timed
+from .embedding_batcher import embed_utterance
+from .prepared_audio import PreparedAudio
+from .speaker_search import get_speaker_search
+from .voiceprint_index import get_voiceprint_index
 
-encoder = VoiceEncoder()
 SAMPLE_RATE = 16000
 
+logger = logging.getLogger(__name__)
+
+# 1:N is held to a higher bar than 1:1: the best of N users clears a fixed
+# threshold by chance far more often than one claimed user does, so the best
+# match must also lead the runner-up by IDENTIFY_MARGIN.
+IDENTIFY_THRESHOLD = float(os.environ.get("MESHPE_IDENTIFY_THRESHOLD", "0.85"))
+IDENTIFY_MARGIN = float(os.environ.get("MESHPE_IDENTIFY_MARGIN", "0.08"))
+
 WORDS = ["apple", "neon", "matrix", "secure", "galaxy", "mesh", "ocean", "binary"]
 
 
@@ -18,21 +30,39 @@ def generate_challenge_word():
     return random.choice(WORDS)
 
 
-def verify_from_audio_array(user_id: str, audio, threshold=0.5):
-    path = get_voiceprint_path(user_id)
-    if not os.path.exists(path):
+def verify_from_audio_array(user_id: str, audio, threshold=0.5, samplerate=SAMPLE_RATE):
+    stored = get_voiceprint_index().get(user_id)
+    if stored is None:
         return {"exists": False, "verified": False, "score": None}
 
-    stored = np.load(path)
-
-    wav = preprocess_wav(audio, SAMPLE_RATE)
-    live = encoder.embed_utterance(wav)
+    wav = PreparedAudio.wrap(audio, samplerate).trimmed
+    live = embed_utterance(wav)
 
     score = float(np.dot(stored, live) / (norm(stored) * norm(live) + 1e-9))
-    print(f"Voice verification score for {user_id}: {score} (threshold {threshold})")
+    verified = score >= threshold
+    count_outcome("verified" if verified else "rejected")
+    logger.info("Voice verification score for %s: %.3f (threshold %s)", user_id, score, threshold)
 
     return {
         "exists": True,
-        "verified": score >= threshold,
+        "verified": verified,
         "score": score
     }
+
+
+def identify_from_audio_array(audio, threshold=IDENTIFY_THRESHOLD, margin=IDENTIFY_MARGIN, samplerate=SAMPLE_RATE):
+    """
+    1:N identification: the enrolled user closest to the utterance as
+    {"user_id", "score"}, or None unless they score at least threshold and
+    beat the runner-up by margin.
+    """
+    live = embed_utterance(PreparedAudio.wrap(audio, samplerate).trimmed)
+    with timed("identify"):
+        matches = get_speaker_search().search(live, 2)
+    if not matches:
+        return None
+    best = matches[0]
+    runner_up = matches[1]["score"] if len(matches) > 1 else -1.0
+    identified = best["score"] >= threshold and best["score"] - runner_up >= margin
+    logger.info("Identification best %.3f, runner-up %.3f -> %s", best["score"], runner_up, identified)
+    return best if identified else None
@@ -0,0 +1,316 @@
+"""
+Bulk enrollment from an existing recording archive.
+
+    python -m ml.bulk_enroll archive/            # one sub-directory (or file) per user
+    python -m ml.bulk_enroll users.csv           # user_id,path[,name,phone,language]
+    python -m ml.bulk_enroll users.jsonl         # {"user_id", "files": [...], "name", ...}
+
+Users are split into chunks that worker processes decode, trim and embed; every
+chunk goes through the encoder in one batched forward pass, and a user with
+several recordings gets the normalised mean of their utterance embeddings. The
+parent writes the per-user .npy files, then every FLUSH_EVERY users publishes
+them to the voiceprint index and user store in one write each and records them
+in a progress journal. Re-running the same command skips users already in the
+journal, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".webm", ".mp3", ".m4a", ".aiff", ".opus"}
+DEFAULT_LANGUAGE = "english"
+USERS_PER_CHUNK = 16
+FLUSH_EVERY = 500
+
+
+# ----- input -----
+
+
+def _is_audio(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+
+
+def _from_directory(root: str) -> Iterator[dict]:
+    """
+    <root>/<user_id>/<any>.wav (several takes per user) or <root>/<user_id>.wav.
+    """
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if entry.is_dir():
+            files = sorted(os.path.join(entry.path, n) for n in os.listdir(entry.path) if _is_audio(n))
+            if files:
+                yield {"user_id": entry.name, "files": files}
+        elif _is_audio(entry.name):
+            yield {"user_id": os.path.splitext(entry.name)[0], "files": [entry.path]}
+
+
+def _from_csv(path: str) -> Iterator[dict]:
+    """
+    One row per recording; rows of the same user are merged.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    users: "OrderedDict[str, dict]" = OrderedDict()
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            user_id = row["user_id"].strip()
+            user = users.setdefault(user_id, {"user_id": user_id, "files": []})
+            user["files"].append(os.path.join(base, row["path"].strip()))
+            for key in ("name", "phone", "language"):
+                if row.get(key):
+                    user[key] = row[key].strip()
+    return iter(users.values())
+
+
+def _from_jsonl(path: str) -> Iterator[dict]:
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            user = json.loads(line)
+            user["files"] = [os.path.join(base, p) for p in user["files"]]
+            yield user
+
+
+def read_source(source: str) -> Iterator[dict]:
+    if os.path.isdir(source):
+        return _from_directory(source)
+    if source.endswith(".csv"):
+        return _from_csv(source)
+    if source.endswith((".jsonl", ".json")):
+        return _from_jsonl(source)
+    raise ValueError(f"Unsupported source {source}: expected a directory, .csv or .jsonl manifest")
+
+
+# ----- journal -----
+
+
+def read_journal(path: str) -> Dict[str, str]:
+    """
+    Last recorded status ("done" / "failed") per user_id.
+    """
+    status: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return status
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash; that user is simply redone.
+                continue
+            status[entry["user_id"]] = entry["status"]
+    return status
+
+
+def _append_journal(path: str, entries: List[dict]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ----- worker side -----
+
+
+def _init_worker(torch_threads: int) -> None:
+    import torch
+
+    # Each process gets its share of the cores instead of all of them.
+    torch.set_num_threads(torch_threads)
+
+
+def embed_chunk(users: List[dict]) -> List[Tuple[str, Optional[np.ndarray], int, List[str]]]:
+    """
+    Decode, trim and embed every recording of a chunk of users in one encoder pass.
+    Returns (user_id, embedding or None, recordings used, errors) per user.
+    """
+    from backend.utils.audio_utils import load_audio_mono_from_bytes
+    from .embedding_batcher import embed_batch
+    from .prepared_audio import PreparedAudio
+
+    wavs: List[np.ndarray] = []
+    owners: List[int] = []
+    errors: List[List[str]] = [[] for _ in users]
+    for i, user in enumerate(users):
+        for path in user["files"]:
+            try:
+                with open(path, "rb") as f:
+                    audio, sr = load_audio_mono_from_bytes(f.read())
+                wavs.append(PreparedAudio(audio, sr).require_speech().trimmed)
+                owners.append(i)
+            except Exception as e:
+                errors[i].append(f"{os.path.basename(path)}: {e}")
+
+    embeds = embed_batch(wavs) if wavs else []
+    per_user: List[List[np.ndarray]] = [[] for _ in users]
+    for owner, emb in zip(owners, embeds):
+        per_user[owner].append(emb)
+
+    results = []
+    for user, embs, errs in zip(users, per_user, errors):
+        if embs:
+            # Same as resemblyzer's embed_speaker: mean of utterance embeddings, renormalised
+            mean = np.mean(embs, axis=0)
+            results.append((user["user_id"], mean / np.linalg.norm(mean), len(embs), errs))
+        else:
+            results.append((user["user_id"], None, 0, errs or ["no audio files"]))
+    return results
+
+
+# ----- parent side -----
+
+
+class _Writer:
+    """
+    Buffers finished users and publishes them in bulk.
+    """
+
+    def __init__(self, journal: str, write_users: bool, language: str):
+        self.journal = journal
+        self.write_users = write_users
+        self.language = language
+        self.embeddings: Dict[str, np.ndarray] = {}
+        self.records: List[dict] = []
+        self.entries: List[dict] = []
+
+    def add(self, user: dict, embedding: Optional[np.ndarray], used: int, errors: List[str]) -> None:
+        from .enroll_voice import get_voiceprint_path
+
+        user_id = user["user_id"]
+        if embedding is None:
+            self.entries.append({"user_id": user_id, "status": "failed", "errors": errors})
+            return
+
+        np.save(get_voiceprint_path(user_id), embedding)
+        self.embeddings[user_id] = embedding
+        # Only what the manifest supplies; merge_users keeps existing profiles' other fields
+        self.records.append({"id": user_id, **{k: user[k] for k in ("name", "phone", "language") if user.get(k)}})
+        self.entries.append({"user_id": user_id, "status": "done", "recordings": used, "errors": errors})
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def flush(self) -> None:
+        from backend.storage.user_store import merge_users
+        from .voiceprint_index import get_voiceprint_index
+
+        get_voiceprint_index().add_many(self.embeddings)
+        if self.write_users and self.records:
+            merge_users(self.records, self.language)
+        # Journal last: anything not journalled yet is redone on resume.
+        _append_journal(self.journal, self.entries)
+        self.embeddings, self.records, self.entries = {}, [], []
+
+
+def _chunks(users: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for user in users:
+        chunk.append(user)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(
+    source: str,
+    journal: Optional[str] = None,
+    workers: Optional[int] = None,
+    users_per_chunk: int = USERS_PER_CHUNK,
+    flush_every: int = FLUSH_EVERY,
+    write_users: bool = True,
+    retry_failed: bool = False,
+    language: str = DEFAULT_LANGUAGE,
+) -> Dict[str, int]:
+    journal = journal or source.rstrip("/\\") + ".enroll-progress.jsonl"
+    workers = workers or os.cpu_count() or 1
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    status = read_journal(journal)
+    skip = {"done", "failed"} if not retry_failed else {"done"}
+    pending = (u for u in read_source(source) if status.get(u["user_id"]) not in skip)
+
+    counts = {"done": 0, "failed": 0, "skipped": sum(1 for s in status.values() if s in skip)}
+    writer = _Writer(journal, write_users, language)
+    started = time.monotonic()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(torch_threads,)) as pool:
+        in_flight = {}
+        chunks = _chunks(pending, users_per_chunk)
+
+        def _submit_next() -> bool:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return False
+            in_flight[pool.submit(embed_chunk, chunk)] = chunk
+            return True
+
+        # Keep every worker busy with one chunk queued behind it, without reading the whole archive
+        while len(in_flight) < 2 * workers and _submit_next():
+            pass
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk = in_flight.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    results = [(u["user_id"], None, 0, [f"worker error: {e}"]) for u in chunk]
+                for user, (_, embedding, used, errors) in zip(chunk, results):
+                    writer.add(user, embedding, used, errors)
+                    counts["done" if embedding is not None else "failed"] += 1
+                _submit_next()
+
+            if len(writer) >= flush_every:
+                writer.flush()
+                elapsed = time.monotonic() - started
+                total = counts["done"] + counts["failed"]
+                print(f"[BulkEnroll] {total} users ({counts['failed']} failed), {total / elapsed:.1f} users/s")
+
+    writer.flush()
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Enroll many users' voiceprints from recordings")
+    parser.add_argument("source", help="directory of recordings, or a .csv / .jsonl manifest")
+    parser.add_argument("--journal", help="progress file (default: <source>.enroll-progress.jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--users-per-chunk", type=int, default=USERS_PER_CHUNK)
+    parser.add_argument("--flush-every", type=int, default=FLUSH_EVERY)
+    parser.add_argument("--no-users", action="store_true", help="only write voiceprints, not user_store records")
+    parser.add_argument("--retry-failed", action="store_true", help="retry users that failed in an earlier run")
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE, help="language for new users the manifest gives none")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    counts = run(
+        args.source,
+        journal=args.journal,
+        workers=args.workers,
+        users_per_chunk=args.users_per_chunk,
+        flush_every=args.flush_every,
+        write_users=not args.no_users,
+        retry_failed=args.retry_failed,
+        language=args.language,
+    )
+    print(
+        f"[BulkEnroll] Enrolled {counts['done']}, failed {counts['failed']}, "
+        f"skipped {counts['skipped']} from earlier runs in {time.monotonic() - started:.1f}s"
+    )
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
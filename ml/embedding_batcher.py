@@ -0,0 +1,156 @@
+"""
+Micro-batching front end for the shared VoiceEncoder.
+
+Concurrent `embed_utterance` calls are held for up to EMBED_BATCH_MAX_WAIT_MS,
+then all of their partial-utterance mel windows run through the encoder in one
+forward pass. Each caller gets back exactly what `VoiceEncoder.embed_utterance`
+would have returned for its own waveform. If a batch fails, its waveforms are
+retried one at a time, so only the caller whose waveform fails sees the error.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import numpy as np
+
+from backend.utils.metrics import timed
+from .model_registry import get_encoder
+
+EMBED_BATCH_MAX_SIZE = int(os.environ.get("MESHPE_EMBED_BATCH_SIZE", "8"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.environ.get("MESHPE_EMBED_BATCH_WAIT_MS", "5"))
+
+# resemblyzer's embed_utterance defaults
+PARTIAL_RATE = 1.3
+PARTIAL_MIN_COVERAGE = 0.75
+
+
+def _partial_mels(wav: np.ndarray) -> np.ndarray:
+    """
+    Mel windows for every partial utterance of wav, as in VoiceEncoder.embed_utterance.
+    """
+    from resemblyzer import VoiceEncoder, audio
+
+    wav_slices, mel_slices = VoiceEncoder.compute_partial_slices(len(wav), PARTIAL_RATE, PARTIAL_MIN_COVERAGE)
+    max_wave_length = wav_slices[-1].stop
+    if max_wave_length >= len(wav):
+        wav = np.pad(wav, (0, max_wave_length - len(wav)), "constant")
+    mel = audio.wav_to_mel_spectrogram(wav)
+    return np.array([mel[s] for s in mel_slices])
+
+
+class EmbeddingBatcher:
+    def __init__(self, max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        self.batches = 0
+        self.embedded = 0
+
+    def embed_utterance(self, wav: np.ndarray) -> np.ndarray:
+        """
+        Embed one preprocessed waveform; blocks until its batch has run.
+        """
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((wav, fut))
+        return fut.result()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> List[Tuple[np.ndarray, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                embeds = self._embed_batch([wav for wav, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # Don't fail every caller for one bad waveform: retry each on its own
+                    self._run_singly(batch)
+                continue
+            for (_, fut), emb in zip(batch, embeds):
+                fut.set_result(emb)
+
+    def _run_singly(self, batch: List[Tuple[np.ndarray, Future]]) -> None:
+        for wav, fut in batch:
+            try:
+                fut.set_result(self._embed_batch([wav])[0])
+            except Exception as e:
+                fut.set_exception(e)
+
+    def _embed_batch(self, wavs: List[np.ndarray]) -> List[np.ndarray]:
+        embeds = embed_batch(wavs)
+        self.batches += 1
+        self.embedded += len(wavs)
+        return embeds
+
+
+def embed_batch(wavs: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Utterance embeddings for several preprocessed waveforms in one encoder forward pass.
+    """
+    import torch
+
+    encoder = get_encoder()
+    per_wav = [_partial_mels(wav) for wav in wavs]
+    counts = [len(m) for m in per_wav]
+
+    with torch.no_grad():
+        mels = torch.from_numpy(np.concatenate(per_wav, axis=0)).to(encoder.device)
+        partial_embeds = encoder(mels).cpu().numpy()
+
+    embeds = []
+    start = 0
+    for n in counts:
+        raw_embed = np.mean(partial_embeds[start:start + n], axis=0)
+        embeds.append(raw_embed / np.linalg.norm(raw_embed, 2))
+        start += n
+    return embeds
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher()
+    return _batcher
+
+
+@timed("embed")
+def embed_utterance(wav: np.ndarray) -> np.ndarray:
+    """
+    Drop-in replacement for `get_encoder().embed_utterance(wav)` that batches concurrent callers.
+    """
+    return get_embedding_batcher().embed_utterance(wav)
@@ -1,10 +1,10 @@
 import os
-os.environ["RESEMBLYZER_FORCE_NO_VAD"] = "1"
 
 import numpy as np
-from resemblyzer import VoiceEncoder, preprocess_wav
+from .embedding_batcher import embed_utterance
+from .prepared_audio import PreparedAudio
+from .voiceprint_index import get_voiceprint_index
 
-encoder = VoiceEncoder()
 SAMPLE_RATE = 16000
 
 
@@ -14,10 +14,12 @@ def get_voiceprint_path(user_id: str):
     return os.path.join(base, f"{user_id}.npy")
 
 
-def enroll_from_audio_array(user_id: str, audio):
-    wav = preprocess_wav(audio, SAMPLE_RATE)
-    emb = encoder.embed_utterance(wav)
+def enroll_from_audio_array(user_id: str, audio, samplerate=SAMPLE_RATE):
+    wav = PreparedAudio.wrap(audio, samplerate).trimmed
+    emb = embed_utterance(wav)
 
     path = get_voiceprint_path(user_id)
     np.save(path, emb)
+    # Publish the new print so verification picks it up without touching disk.
+    get_voiceprint_index().add(user_id, emb)
     return path
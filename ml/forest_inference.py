@@ -0,0 +1,116 @@
+"""
+Plain-NumPy inference for tree-ensemble classifiers exported from scikit-learn.
+
+`export_forest` flattens a fitted RandomForestClassifier (or a single
+DecisionTreeClassifier) into a handful of arrays saved with np.savez; `NumpyForest`
+loads them without pickle or sklearn and scores rows by walking every tree at once.
+"""
+import numpy as np
+
+
+class NumpyForest:
+    """
+    All trees stored as one node table. Leaves point to themselves and compare
+    against +inf, so every row can take exactly `max_depth` vectorised steps.
+    """
+
+    def __init__(self, classes, roots, feature, threshold, left, right, value, max_depth):
+        self.classes_ = np.asarray(classes)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyForest":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["classes"],
+                data["roots"],
+                data["feature"],
+                data["threshold"],
+                data["left"],
+                data["right"],
+                data["value"],
+                data["max_depth"],
+            )
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities, shape (n_rows, n_classes), matching sklearn's predict_proba.
+        """
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].mean(axis=1)
+
+
+def export_forest(model, path: str) -> None:
+    """
+    Save a fitted sklearn tree classifier (forest or single tree) as an .npz file.
+    """
+    estimators = getattr(model, "estimators_", [model])
+
+    roots, feature, threshold, left, right, value = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in estimators:
+        tree = est.tree_
+        n = tree.node_count
+        local = np.arange(n)
+        is_leaf = tree.children_left == -1
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, local, tree.children_left) + offset)
+        right.append(np.where(is_leaf, local, tree.children_right) + offset)
+
+        # Single-output classifiers: (n_nodes, 1, n_classes) counts -> probabilities
+        counts = tree.value[:, 0, :].astype(np.float64)
+        totals = counts.sum(axis=1, keepdims=True)
+        totals[totals == 0.0] = 1.0
+        value.append(counts / totals)
+
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    np.savez(
+        path,
+        classes=np.asarray(model.classes_),
+        roots=np.asarray(roots, dtype=np.int64),
+        feature=np.concatenate(feature).astype(np.int64),
+        threshold=np.concatenate(threshold),
+        left=np.concatenate(left).astype(np.int64),
+        right=np.concatenate(right).astype(np.int64),
+        value=np.concatenate(value),
+        max_depth=np.int64(max_depth),
+    )
+
+
+if __name__ == "__main__":
+    # python -m ml.forest_inference [model.pkl] [model.npz]
+    # Needs scikit-learn installed; the backend itself only needs the .npz.
+    import os
+    import pickle
+    import sys
+
+    here = os.path.dirname(__file__)
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, "anti_replay_model.pkl")
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(src)[0] + ".npz"
+
+    with open(src, "rb") as f:
+        fitted = pickle.load(f)
+    export_forest(fitted, dst)
+    print(f"Exported {type(fitted).__name__} to {dst}")
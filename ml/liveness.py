@@ -1,39 +1,33 @@
-import os
-import pickle
+import logging
+from typing import List
+
 import numpy as np
-import librosa
+from backend.utils.metrics import count_outcome, timed
+from .model_registry import get_anti_replay_model
+from .prepared_audio import PreparedAudio
 
-# Global cache for the model
-_MODEL = None
-_MODEL_PATH = os.path.join(os.path.dirname(__file__), "anti_replay_model.pkl")
 LIVENESS_THRESHOLD = 0.9  # Probability threshold for "Fake/Replay" class
 
-def _load_model():
-    global _MODEL
-    if _MODEL is not None:
-        return _MODEL
-    
-    if not os.path.exists(_MODEL_PATH):
-        print(f"[Liveness] Model not found at {_MODEL_PATH}")
-        return None
+logger = logging.getLogger(__name__)
 
-    try:
-        with open(_MODEL_PATH, 'rb') as f:
-            _MODEL = pickle.load(f)
-        print("[Liveness] Anti-replay model loaded successfully")
-    except Exception as e:
-        print(f"[Liveness] Failed to load model: {e}")
-    
-    return _MODEL
+def _load_model():
+    # Shared with every other service through the model registry
+    return get_anti_replay_model()
 
 def _extract_features(audio: np.ndarray, sr: int) -> np.ndarray:
+    import librosa
+
     try:
-        # Ensure audio is float32
-        if audio.dtype != np.float32:
-            audio = audio.astype(np.float32)
+        if isinstance(audio, PreparedAudio):
+            # MFCCs are cached on the prepared audio
+            mfccs = audio.mfcc(13)
+        else:
+            # Ensure audio is float32
+            if audio.dtype != np.float32:
+                audio = audio.astype(np.float32)
 
-        # MFCC extraction (13 coeffs)
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
+            # MFCC extraction (13 coeffs)
+            mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
         # Delta features
         delta = librosa.feature.delta(mfccs)
         # Stack and flatten
@@ -41,22 +35,31 @@ def _extract_features(audio: np.ndarray, sr: int) -> np.ndarray:
         # Mean across time -> shape (1, 26)
         return np.mean(combined.T, axis=0).reshape(1, -1)
     except Exception as e:
-        print(f"[Liveness] Feature extraction error: {e}")
+        logger.error("Feature extraction error: %s", e)
         return None
 
+@timed("liveness")
 def check_liveness(audio: np.ndarray, samplerate=16000) -> bool:
     """
     Returns True if audio is LIVE, False if REPLAY/FAKE.
     """
+    is_live = _check_liveness(audio, samplerate)
+    if not is_live:
+        count_outcome("liveness_fail")
+    return is_live
+
+
+def _check_liveness(audio, samplerate: int) -> bool:
     model = _load_model()
     if model is None:
         # Fail safe: if model missing, assume live (or fail secure depending on policy)
         # For now, let's log error and return True to not block dev, 
         # but in prod this should probably be False.
-        print("[Liveness] WARNING: Model missing, skipping check.")
+        logger.warning("Model missing, skipping check.")
         return True
 
-    features = _extract_features(audio, samplerate)
+    # The classifier was trained on 16 kHz MFCCs
+    features = _extract_features(PreparedAudio.wrap(audio, samplerate), 16000)
     if features is None:
         return False
 
@@ -67,9 +70,42 @@ def check_liveness(audio: np.ndarray, samplerate=16000) -> bool:
         prob = model.predict_proba(features)[0][1]
         
         is_live = prob < LIVENESS_THRESHOLD
-        print(f"[Liveness] Score: {prob:.3f} (Threshold: {LIVENESS_THRESHOLD}) -> {'LIVE' if is_live else 'FAKE'}")
+        logger.info("Score: %.3f (Threshold: %s) -> %s", prob, LIVENESS_THRESHOLD, "LIVE" if is_live else "FAKE")
         
         return is_live
     except Exception as e:
-        print(f"[Liveness] Prediction error: {e}")
+        logger.error("Prediction error: %s", e)
         return False
+
+@timed("liveness")
+def check_liveness_batch(audios: List, samplerate=16000) -> List[bool]:
+    """
+    check_liveness for many clips, scored with one predict_proba call.
+    Clips whose features can't be extracted are reported as not live.
+    """
+    results = _check_liveness_batch(audios, samplerate)
+    count_outcome("liveness_fail", results.count(False))
+    return results
+
+
+def _check_liveness_batch(audios: List, samplerate: int) -> List[bool]:
+    model = _load_model()
+    if model is None:
+        logger.warning("Model missing, skipping check.")
+        return [True] * len(audios)
+
+    features = [_extract_features(PreparedAudio.wrap(a, samplerate), 16000) for a in audios]
+    ok = [i for i, f in enumerate(features) if f is not None]
+    results = [False] * len(audios)
+    if not ok:
+        return results
+
+    try:
+        probs = model.predict_proba(np.vstack([features[i] for i in ok]))[:, 1]
+    except Exception as e:
+        logger.error("Prediction error: %s", e)
+        return results
+
+    for i, prob in zip(ok, probs):
+        results[i] = bool(prob < LIVENESS_THRESHOLD)
+    return results
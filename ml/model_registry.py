@@ -0,0 +1,132 @@
+"""
+Process-wide registry for the heavy ML models.
+
+Every model is loaded at most once per process: on first use, or up front via
+`warm_up()`. All services share the returned instances.
+"""
+import logging
+import os
+import pickle
+import threading
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+WHISPER_MODEL_SIZE = "base"
+# First-pass model for cascaded decoding (see ml/stt_whisper.py)
+WHISPER_FAST_MODEL_SIZE = os.environ.get("MESHPE_WHISPER_FAST_MODEL", "tiny")
+WHISPER_CASCADE = os.environ.get("MESHPE_WHISPER_CASCADE", "0") == "1"
+WHISPER_DEVICE = "cpu"
+WHISPER_COMPUTE_TYPE = "int8"
+
+# NumPy export of the classifier (see ml/forest_inference.py); the pickle is only a fallback.
+ANTI_REPLAY_NPZ_PATH = os.path.join(os.path.dirname(__file__), "anti_replay_model.npz")
+ANTI_REPLAY_MODEL_PATH = os.path.join(os.path.dirname(__file__), "anti_replay_model.pkl")
+
+_models: Dict[str, object] = {}
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _load_once(name: str, loader: Callable[[], object]):
+    if name in _models:
+        return _models[name]
+
+    with _locks_guard:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _models:
+            _models[name] = loader()
+    return _models[name]
+
+
+def _load_encoder():
+    from resemblyzer import VoiceEncoder
+
+    return VoiceEncoder()
+
+
+def _load_whisper(size: str):
+    from faster_whisper import WhisperModel
+    from .whisper_pool import WhisperPool
+
+    def _new_model(cpu_threads: int, num_workers: int):
+        return WhisperModel(
+            size,
+            device=WHISPER_DEVICE,
+            compute_type=WHISPER_COMPUTE_TYPE,
+            cpu_threads=cpu_threads,
+            num_workers=num_workers,
+        )
+
+    return WhisperPool(_new_model)
+
+
+def _load_anti_replay():
+    if os.path.exists(ANTI_REPLAY_NPZ_PATH):
+        from .forest_inference import NumpyForest
+
+        try:
+            model = NumpyForest.load(ANTI_REPLAY_NPZ_PATH)
+            logger.info("Anti-replay model loaded")
+            return model
+        except Exception as e:
+            logger.warning("Failed to load anti-replay export, trying pickle: %s", e)
+
+    if not os.path.exists(ANTI_REPLAY_MODEL_PATH):
+        logger.warning("Anti-replay model not found at %s", ANTI_REPLAY_MODEL_PATH)
+        return None
+
+    try:
+        with open(ANTI_REPLAY_MODEL_PATH, "rb") as f:
+            model = pickle.load(f)
+        logger.info("Anti-replay model loaded from pickle; run `python -m ml.forest_inference` to export it")
+        return model
+    except Exception as e:
+        logger.exception("Failed to load anti-replay model")
+        return None
+
+
+def get_encoder():
+    """
+    Shared resemblyzer VoiceEncoder used for enrollment and verification.
+    """
+    return _load_once("encoder", _load_encoder)
+
+
+def get_whisper_model():
+    """
+    Shared pool of faster-whisper models used for speech-to-text.
+    Exposes the same transcribe() call as a single WhisperModel.
+    """
+    return _load_once("whisper", lambda: _load_whisper(WHISPER_MODEL_SIZE))
+
+
+def get_fast_whisper_model():
+    """
+    Shared pool of the smaller first-pass Whisper model used when WHISPER_CASCADE is on.
+    """
+    return _load_once("whisper_fast", lambda: _load_whisper(WHISPER_FAST_MODEL_SIZE))
+
+
+def get_anti_replay_model():
+    """
+    Shared anti-replay classifier, or None if it is missing or failed to load.
+    A failed load is cached as well, so it is not retried on every request.
+    """
+    return _load_once("anti_replay", _load_anti_replay)
+
+
+def warm_up() -> None:
+    """
+    Load every model now instead of on the first request.
+    """
+    get_encoder()
+    get_whisper_model()
+    if WHISPER_CASCADE:
+        get_fast_whisper_model()
+    get_anti_replay_model()
+
+
+def loaded_models() -> Dict[str, bool]:
+    return {name: name in _models for name in ("encoder", "whisper", "whisper_fast", "anti_replay")}
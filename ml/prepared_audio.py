@@ -0,0 +1,114 @@
+import os
+from functools import cached_property
+from typing import Dict
+
+import numpy as np
+
+from backend.utils.audio_utils import detect_speech, load_audio_mono_from_bytes, resample
+from backend.utils.metrics import count_outcome
+
+SAMPLE_RATE = 16000
+# Clips with less voiced audio than this are rejected before any model runs.
+MIN_SPEECH_SECONDS = float(os.environ.get("MESHPE_MIN_SPEECH_SECONDS", "0.4"))
+
+
+class InsufficientSpeech(ValueError):
+    pass
+
+
+class PreparedAudio:
+    """
+    One decoded upload, prepared once and shared by every ML stage of a request.
+
+    Each derived signal (16 kHz waveform, speech span, peak-normalised waveform for
+    Whisper, resemblyzer-trimmed waveform, MFCCs) is computed on first access and
+    cached, so verification, liveness and STT never repeat the same preprocessing.
+    Whisper and the encoder only see the speech span; liveness keeps the whole clip,
+    which is what the anti-replay classifier was trained on.
+    """
+
+    def __init__(self, audio: np.ndarray, samplerate: int = SAMPLE_RATE):
+        self.raw = audio
+        self.source_sr = samplerate
+        self._mfcc: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def wrap(cls, audio, samplerate: int = SAMPLE_RATE) -> "PreparedAudio":
+        """
+        Return audio unchanged if it is already prepared, otherwise prepare it.
+        """
+        if isinstance(audio, cls):
+            return audio
+        return cls(audio, samplerate)
+
+    @classmethod
+    def from_upload(cls, data: bytes, min_seconds: float = MIN_SPEECH_SECONDS) -> "PreparedAudio":
+        """
+        Decode uploaded bytes and reject the clip early if it holds too little speech.
+        """
+        audio, sr = load_audio_mono_from_bytes(data)
+        return cls(audio, sr).require_speech(min_seconds)
+
+    @cached_property
+    def wav(self) -> np.ndarray:
+        """
+        Mono float32 waveform at 16 kHz.
+        """
+        return resample(self.raw, self.source_sr, SAMPLE_RATE)
+
+    @cached_property
+    def _speech_span(self):
+        return detect_speech(self.wav, SAMPLE_RATE)
+
+    @property
+    def speech_seconds(self) -> float:
+        return self._speech_span[2]
+
+    @cached_property
+    def speech(self) -> np.ndarray:
+        """
+        16 kHz waveform with leading and trailing silence cut off.
+        """
+        start, end, _ = self._speech_span
+        if end <= start:
+            return self.wav
+        return self.wav[start:end]
+
+    def require_speech(self, min_seconds: float = MIN_SPEECH_SECONDS) -> "PreparedAudio":
+        """
+        Raise InsufficientSpeech unless the clip holds at least min_seconds of speech.
+        """
+        if self.speech_seconds < min_seconds:
+            count_outcome("no_speech")
+            raise InsufficientSpeech(
+                f"Too little speech detected ({self.speech_seconds:.1f}s). Please speak clearly and try again."
+            )
+        return self
+
+    @cached_property
+    def normalized(self) -> np.ndarray:
+        """
+        Peak-normalised speech span at 16 kHz, as fed to Whisper.
+        """
+        wav = self.speech
+        return (wav / (np.max(np.abs(wav)) + 1e-8)).astype(np.float32)
+
+    @cached_property
+    def trimmed(self) -> np.ndarray:
+        """
+        Volume-normalised speech span with long silences trimmed, as fed to the VoiceEncoder.
+        """
+        from resemblyzer import preprocess_wav
+
+        # Already at the encoder's rate, so skip resemblyzer's own resample.
+        return preprocess_wav(self.speech)
+
+    def mfcc(self, n_mfcc: int = 13) -> np.ndarray:
+        """
+        MFCC matrix (n_mfcc, frames) of the 16 kHz waveform.
+        """
+        if n_mfcc not in self._mfcc:
+            import librosa
+
+            self._mfcc[n_mfcc] = librosa.feature.mfcc(y=self.wav, sr=SAMPLE_RATE, n_mfcc=n_mfcc)
+        return self._mfcc[n_mfcc]
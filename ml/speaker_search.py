@@ -0,0 +1,230 @@
+"""
+1:N speaker identification over the packed voiceprint matrix.
+
+Rows of the VoiceprintIndex matrix are unit length, so cosine similarity with a
+unit-length query is a plain dot product. Two search strategies:
+
+  - exact: the matrix is scored in blocks of EXACT_BLOCK_ROWS rows, keeping a
+    running top-k, so memory stays flat however many users are enrolled
+  - ivf: an inverted-file index. Spherical k-means partitions the voiceprints
+    into ~sqrt(n) lists; a query only scores the rows in the IVF_N_PROBE lists
+    whose centroids are closest to it
+
+"auto" (the default) uses exact search below IVF_MIN_USERS voiceprints and IVF above.
+"""
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .voiceprint_index import VoiceprintIndex, get_voiceprint_index
+
+IDENTIFY_MODE = os.environ.get("MESHPE_IDENTIFY_MODE", "auto")  # auto | exact | ivf
+IVF_MIN_USERS = int(os.environ.get("MESHPE_IVF_MIN_USERS", "50000"))
+IVF_N_PROBE = int(os.environ.get("MESHPE_IVF_N_PROBE", "16"))
+IVF_TRAIN_ITERATIONS = 10
+# k-means trains on this many rows per list (sampled); the rest are only assigned.
+IVF_TRAIN_POINTS_PER_LIST = 40
+# Retrain the centroids once the index has grown this much since they were fitted.
+IVF_RETRAIN_GROWTH = 4.0
+EXACT_BLOCK_ROWS = 65536
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k highest scores, best first.
+    """
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def exact_top_k(
+    matrix: np.ndarray, query: np.ndarray, k: int, block_rows: int = EXACT_BLOCK_ROWS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows of matrix with the k highest dot products against query, and their scores.
+    """
+    best_rows = np.empty(0, dtype=np.intp)
+    best_scores = np.empty(0, dtype=np.float32)
+    for start in range(0, matrix.shape[0], block_rows):
+        scores = np.asarray(matrix[start:start + block_rows] @ query, dtype=np.float32)
+        top = _top_k(scores, k)
+        rows = np.concatenate([best_rows, top + start])
+        merged = np.concatenate([best_scores, scores[top]])
+        keep = _top_k(merged, k)
+        best_rows, best_scores = rows[keep], merged[keep]
+    return best_rows, best_scores
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray, block_rows: int = EXACT_BLOCK_ROWS) -> np.ndarray:
+    labels = np.empty(matrix.shape[0], dtype=np.intp)
+    for start in range(0, matrix.shape[0], block_rows):
+        labels[start:start + block_rows] = np.argmax(matrix[start:start + block_rows] @ centroids.T, axis=1)
+    return labels
+
+
+def _centroid_sums(sample: np.ndarray, labels: np.ndarray, n_lists: int) -> np.ndarray:
+    order = np.argsort(labels, kind="stable")
+    counts = np.bincount(labels, minlength=n_lists)
+    used = np.flatnonzero(counts)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[used]
+    sums = np.zeros((n_lists, sample.shape[1]), dtype=np.float32)
+    sums[used] = np.add.reduceat(sample[order], starts, axis=0)
+    return sums
+
+
+class IVFIndex:
+    """
+    Inverted lists over a voiceprint matrix: list i holds the rows closest to centroid i,
+    stored CSR-style as one row array sliced by offsets.
+
+    Each row's score against its own centroid is kept as a fingerprint, so after the
+    matrix changes only new rows and rows whose content changed are reassigned: an
+    O(n * dim) pass instead of scoring every row against every centroid again.
+    """
+
+    def __init__(self, centroids: np.ndarray, trained_on: int):
+        self.centroids = centroids
+        self.trained_on = trained_on
+        self.labels = np.empty(0, dtype=np.intp)
+        self.fit = np.empty(0, dtype=np.float32)
+        self.offsets = np.zeros(len(centroids) + 1, dtype=np.intp)
+        self.rows = np.empty(0, dtype=np.intp)
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, n_lists: Optional[int] = None, seed: int = 0) -> "IVFIndex":
+        """
+        Fit centroids with spherical k-means on (a sample of) matrix and assign every row.
+        """
+        n = matrix.shape[0]
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, n_lists * IVF_TRAIN_POINTS_PER_LIST)
+        sample_rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        n_lists = min(n_lists, len(sample))
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = _assign(sample, centroids)
+            sums = _centroid_sums(sample, labels, n_lists)
+            empty = ~sums.any(axis=1)
+            # Reseed empty lists from random points so every list stays in use
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-9)
+
+        ivf = cls(centroids.astype(np.float32), trained_on=n)
+        ivf.assign(matrix)
+        return ivf
+
+    def _fit(self, matrix: np.ndarray, labels: np.ndarray, block_rows: int = EXACT_BLOCK_ROWS) -> np.ndarray:
+        """
+        Score of each row of matrix against its assigned centroid.
+        """
+        fit = np.empty(len(labels), dtype=np.float32)
+        for start in range(0, len(labels), block_rows):
+            block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+            centroids = self.centroids[labels[start:start + block_rows]]
+            fit[start:start + block_rows] = np.einsum("ij,ij->i", block, centroids)
+        return fit
+
+    def assign(self, matrix: np.ndarray) -> None:
+        """
+        Bring the inverted lists in line with matrix, reassigning only rows that are
+        new or whose content changed since the last call.
+        """
+        n = matrix.shape[0]
+        kept = min(len(self.labels), n)
+        labels = np.empty(n, dtype=np.intp)
+        fit = np.empty(n, dtype=np.float32)
+        labels[:kept] = self.labels[:kept]
+        fit[:kept] = self._fit(matrix[:kept], labels[:kept])
+
+        todo = np.concatenate([np.flatnonzero(fit[:kept] != self.fit[:kept]), np.arange(kept, n)])
+        if len(todo):
+            rows = np.asarray(matrix[todo], dtype=np.float32)
+            labels[todo] = _assign(rows, self.centroids)
+            fit[todo] = np.einsum("ij,ij->i", rows, self.centroids[labels[todo]])
+
+        self.labels, self.fit = labels, fit
+        self.rows = np.argsort(labels, kind="stable")
+        self.offsets = np.zeros(len(self.centroids) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(labels, minlength=len(self.centroids)), out=self.offsets[1:])
+
+    def search(
+        self, matrix: np.ndarray, query: np.ndarray, k: int, n_probe: int = IVF_N_PROBE
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        probe = _top_k(self.centroids @ query, min(n_probe, len(self.centroids)))
+        candidates = np.sort(np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in probe]))
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = np.asarray(matrix[candidates] @ query, dtype=np.float32)
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+
+class SpeakerSearch:
+    """
+    Top-k lookup over a VoiceprintIndex. The IVF lists are rebuilt lazily whenever
+    the index version changes; centroids are only retrained after large growth.
+    """
+
+    def __init__(self, index: VoiceprintIndex, mode: str = IDENTIFY_MODE):
+        if mode not in ("auto", "exact", "ivf"):
+            raise ValueError(f"Unknown identification mode: {mode}")
+        self.index = index
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._ivf: Optional[IVFIndex] = None
+        self._ivf_version = None
+
+    def _use_ivf(self, n: int) -> bool:
+        if self.mode == "auto":
+            return n >= IVF_MIN_USERS
+        return self.mode == "ivf"
+
+    def _ivf_for(self, version, matrix: np.ndarray) -> IVFIndex:
+        with self._lock:
+            if self._ivf is not None and self._ivf_version == version:
+                return self._ivf
+            if self._ivf is None or matrix.shape[0] > IVF_RETRAIN_GROWTH * self._ivf.trained_on:
+                self._ivf = IVFIndex.train(matrix)
+            else:
+                self._ivf.assign(matrix)
+            self._ivf_version = version
+            return self._ivf
+
+    def search(self, embedding: np.ndarray, k: int = 5) -> List[dict]:
+        """
+        The k enrolled users most similar to embedding, as {"user_id", "score"}, best first.
+        """
+        version, user_ids, matrix = self.index.snapshot()
+        if not user_ids or k <= 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        query = query / (np.linalg.norm(query) + 1e-9)
+
+        if self._use_ivf(len(user_ids)):
+            rows, scores = self._ivf_for(version, matrix).search(matrix, query, k)
+        else:
+            rows, scores = exact_top_k(matrix, query, k)
+        return [{"user_id": user_ids[row], "score": float(score)} for row, score in zip(rows, scores)]
+
+
+_search = None
+_search_lock = threading.Lock()
+
+
+def get_speaker_search() -> SpeakerSearch:
+    global _search
+    if _search is None:
+        with _search_lock:
+            if _search is None:
+                _search = SpeakerSearch(get_voiceprint_index())
+    return _search
@@ -0,0 +1,116 @@
+"""
+Rolling-window transcription for audio that is still being recorded.
+"""
+from typing import List, Optional
+
+import numpy as np
+
+from backend.utils.audio_utils import VAD_PAD_MS, detect_speech
+from .prepared_audio import PreparedAudio
+from .stt_whisper import _is_complete, parse_command, transcribe, transcribe_and_parse_from_audio_array
+
+# Re-transcribe after this much new audio has arrived.
+STREAM_STEP_SECONDS = 1.0
+# Whisper only looks at 30 s at a time; payment commands are far shorter.
+STREAM_WINDOW_SECONDS = 30.0
+
+PARSE_FIELDS = ("action", "amount", "receiver")
+
+class StreamingTranscriber:
+    """
+    Accumulates decoded samples and transcribes the most recent window whenever
+    STREAM_STEP_SECONDS of new audio is available.
+
+    A parsed field counts as stable once two consecutive passes agree on it.
+    The final result reuses the last partial when everything after it is silence;
+    otherwise the whole recording is transcribed again. Stitching a transcript of
+    the tail onto the partial is not safe: the cut can fall inside a word or number,
+    and "pay 100" + "50 to ravi" would parse as 100.
+    """
+
+    def __init__(self, step_seconds: float = STREAM_STEP_SECONDS, window_seconds: float = STREAM_WINDOW_SECONDS):
+        self.step_seconds = step_seconds
+        self.window_seconds = window_seconds
+        self.samplerate: Optional[int] = None
+
+        self._chunks: List[np.ndarray] = []
+        self._total = 0
+        self._transcribed_at = 0
+        self._previous: dict = {}
+        # Whether the last partial's window started at the first sample
+        self._previous_from_start = False
+        self.stable: dict = {}
+
+    def append(self, samples: np.ndarray, samplerate: int) -> None:
+        if samplerate is None or not len(samples):
+            return
+        self.samplerate = samplerate
+        self._chunks.append(samples)
+        self._total += len(samples)
+
+    @property
+    def seconds(self) -> float:
+        return self._total / self.samplerate if self.samplerate else 0.0
+
+    def due(self) -> bool:
+        if not self.samplerate:
+            return False
+        return self._total - self._transcribed_at >= self.step_seconds * self.samplerate
+
+    def audio(self) -> np.ndarray:
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def _fast_transcribe(self, audio: PreparedAudio) -> str:
+        return transcribe(audio.normalized, beam_size=1, without_timestamps=True, condition_on_previous_text=False)
+
+    def partial(self) -> dict:
+        """
+        Transcribe the latest window with fast greedy decoding and report what has stabilised.
+        """
+        self._transcribed_at = self._total
+        window_samples = int(self.window_seconds * self.samplerate)
+        window = self.audio()[-window_samples:]
+        self._previous_from_start = self._total <= window_samples
+
+        result = parse_command(self._fast_transcribe(PreparedAudio(window, self.samplerate)))
+
+        for field in PARSE_FIELDS:
+            value = result[field]
+            if value is not None and value == self._previous.get(field):
+                self.stable[field] = value
+        self._previous = result
+
+        return {"type": "partial", **result, "stable": dict(self.stable)}
+
+    def _from_last_partial(self) -> Optional[dict]:
+        """
+        The last partial's command if it covered the whole recording up to where the
+        speech ends and parsed completely, else None.
+        """
+        if not self._previous_from_start:
+            return None
+        if self._transcribed_at < self._total:
+            audio = self.audio()
+            _, speech_end, voiced = detect_speech(audio, self.samplerate)
+            # Any voiced frame after the partial's cut means speech it didn't hear whole.
+            # speech_end is padded, unless the padding ran into the end of the clip.
+            last_voiced = speech_end - self.samplerate * VAD_PAD_MS // 1000
+            if voiced and (speech_end >= len(audio) or last_voiced > self._transcribed_at):
+                return None
+        if not _is_complete(self._previous):
+            return None
+        return dict(self._previous)
+
+    def final(self) -> dict:
+        """
+        The command for everything received: the last partial when only silence
+        followed it, otherwise the whole recording with the regular decoding options.
+        """
+        if not self._total:
+            raise ValueError("No audio received")
+        result = self._from_last_partial()
+        if result is None:
+            result = transcribe_and_parse_from_audio_array(self.audio(), self.samplerate)
+        return {"type": "final", **result}
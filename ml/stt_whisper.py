@@ -1,25 +1,43 @@
+import logging
+import os
+import threading
+
 import numpy as np
-from faster_whisper import WhisperModel
+from backend.utils.metrics import count_outcome, timed
+from .model_registry import WHISPER_CASCADE, get_fast_whisper_model, get_whisper_model
 from .nlp_parse import extract_amount, extract_action, extract_receiver
+from .prepared_audio import PreparedAudio
 
-_model = WhisperModel("base", device="cpu", compute_type="int8")
-
+# Cascade: escalate from the fast model when its mean segment log-probability is below this.
+CASCADE_MIN_AVG_LOGPROB = float(os.environ.get("MESHPE_WHISPER_CASCADE_MIN_LOGPROB", "-0.6"))
+# Payment commands are short and regular, so the first pass skips beam search and timestamps.
+FAST_DECODE_OPTIONS = {"beam_size": 1, "without_timestamps": True, "condition_on_previous_text": False}
 
-import scipy.signal
+logger = logging.getLogger(__name__)
 
-def transcribe_and_parse_from_audio_array(audio: np.ndarray, samplerate: int = 16000):
-    # Resample to 16000 Hz if needed (Whisper expects 16k)
-    if samplerate != 16000:
-        num_samples = int(len(audio) * 16000 / samplerate)
-        print(f"Resampling audio from {samplerate}Hz to 16000Hz...")
-        audio = scipy.signal.resample(audio, num_samples)
+_cascade_lock = threading.Lock()
+_cascade_counts = {"requests": 0, "escalated_low_confidence": 0, "escalated_parse": 0}
 
-    audio = audio.astype("float32")
-    audio = audio / (np.max(np.abs(audio)) + 1e-8)
 
-    segments, _ = _model.transcribe(audio)
+@timed("stt")
+def _transcribe_segments(model, audio: np.ndarray, **options):
+    segments, _ = model.transcribe(audio, **options)
+    segments = list(segments)
     text = " ".join(seg.text for seg in segments).strip().lower()
+    avg_logprob = float(np.mean([seg.avg_logprob for seg in segments])) if segments else float("-inf")
+    return text, avg_logprob
+
+
+def transcribe(audio: np.ndarray, **options) -> str:
+    """
+    Run Whisper on 16 kHz peak-normalised float32 audio and return lowercased text.
+    """
+    text, _ = _transcribe_segments(get_whisper_model(), audio, **options)
+    return text
 
+
+@timed("nlp")
+def parse_command(text: str) -> dict:
     action = extract_action(text)
     amount = extract_amount(text)
     receiver = extract_receiver(text)
@@ -30,3 +48,54 @@ def transcribe_and_parse_from_audio_array(audio: np.ndarray, samplerate: int = 1
         "amount": amount,
         "receiver": receiver
     }
+
+
+def _is_complete(cmd: dict) -> bool:
+    return bool(cmd["action"] and cmd["amount"] is not None and cmd["receiver"])
+
+
+def _transcribe_cascade(audio: np.ndarray) -> dict:
+    """
+    Fast model first; fall back to the full model when the first pass is unsure
+    or the parser can't find action, amount and receiver.
+    """
+    text, avg_logprob = _transcribe_segments(get_fast_whisper_model(), audio, **FAST_DECODE_OPTIONS)
+    cmd = parse_command(text)
+
+    reason = None
+    if avg_logprob < CASCADE_MIN_AVG_LOGPROB:
+        reason = "escalated_low_confidence"
+    elif not _is_complete(cmd):
+        reason = "escalated_parse"
+
+    with _cascade_lock:
+        _cascade_counts["requests"] += 1
+        if reason:
+            _cascade_counts[reason] += 1
+
+    if reason is None:
+        return cmd
+    logger.info("Cascade escalation (%s): '%s' avg_logprob=%.2f", reason, text, avg_logprob)
+    return parse_command(transcribe(audio))
+
+
+def cascade_stats() -> dict:
+    with _cascade_lock:
+        counts = dict(_cascade_counts)
+    escalated = counts["escalated_low_confidence"] + counts["escalated_parse"]
+    counts["escalation_rate"] = round(escalated / counts["requests"], 4) if counts["requests"] else 0.0
+    counts["enabled"] = WHISPER_CASCADE
+    return counts
+
+
+def transcribe_and_parse_from_audio_array(audio: np.ndarray, samplerate: int = 16000):
+    # Whisper expects 16 kHz, peak-normalised float32; reuse it if already prepared
+    audio = PreparedAudio.wrap(audio, samplerate).normalized
+
+    if WHISPER_CASCADE:
+        cmd = _transcribe_cascade(audio)
+    else:
+        cmd = parse_command(transcribe(audio))
+    if not _is_complete(cmd):
+        count_outcome("parse_fail")
+    return cmd
@@ -0,0 +1,352 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VOICEPRINT_DIR = os.path.join("ml", "models", "stored_voiceprints")
+INDEX_FILE = "_index.json"
+INDEX_MATRIX_PREFIX = "_index-"
+INDEX_LOCK_FILE = "_index.lock"
+
+# How often (seconds) a worker checks whether another process rewrote the index.
+STALE_CHECK_INTERVAL = 1.0
+
+
+class _View(NamedTuple):
+    """
+    One opened index. Published by a single attribute assignment and never mutated,
+    so a reader that takes `self._view` once sees ids, rows and matrix that agree.
+    """
+
+    generation: int
+    user_ids: List[str]
+    rows: Dict[str, int]
+    matrix: np.ndarray
+
+
+_EMPTY_VIEW = _View(0, [], {}, np.zeros((0, 0), dtype=np.float32))
+
+
+class VoiceprintIndex:
+    """
+    All enrolled voiceprints packed into one contiguous (n_users, dim) float32 matrix.
+
+    The per-user `<user_id>.npy` files written by enrollment stay the source of truth.
+    On load they are packed into `_index-<version>.npy` (opened memory-mapped) and
+    `_index.json` (matrix file name + row order), so verification is a dict lookup and a
+    row read instead of a file open. Rows are L2-normalised, which leaves cosine scores
+    unchanged. Each rewrite uses a fresh matrix file so a mapped one is never replaced.
+
+    Rewrites are read-modify-write across processes, so they run under an exclusive
+    lock on `_index.lock` and re-read the manifest once they hold it.
+    """
+
+    def __init__(self, base_dir: str = VOICEPRINT_DIR):
+        self.base_dir = base_dir
+        self.index_path = os.path.join(base_dir, INDEX_FILE)
+        self.lock_path = os.path.join(base_dir, INDEX_LOCK_FILE)
+
+        self._lock = threading.RLock()
+        # Its generation is bumped on every (re)open, so in-process caches can tell the index changed.
+        self._view = _EMPTY_VIEW
+        self._stamp = None
+        self._last_check = 0.0
+        self._loaded = False
+
+    # ----- loading -----
+
+    def _voiceprint_files(self) -> Dict[str, os.DirEntry]:
+        if not os.path.isdir(self.base_dir):
+            return {}
+        files = {}
+        for entry in os.scandir(self.base_dir):
+            name = entry.name
+            if name.endswith(".npy") and not name.startswith(INDEX_MATRIX_PREFIX):
+                files[name[: -len(".npy")]] = entry
+        return files
+
+    def _index_stamp(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read_manifest(self) -> dict:
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _index_is_current(self, files: Dict[str, os.DirEntry]) -> bool:
+        stamp = self._index_stamp()
+        if stamp is None:
+            return False
+        try:
+            manifest = self._read_manifest()
+        except Exception:
+            return False
+        if not os.path.exists(os.path.join(self.base_dir, manifest["matrix"])):
+            return False
+        if set(manifest["user_ids"]) != set(files):
+            return False
+        return all(entry.stat().st_mtime_ns <= stamp for entry in files.values())
+
+    def _open_packed(self) -> None:
+        manifest = self._read_manifest()
+        user_ids = manifest["user_ids"]
+        if user_ids:
+            matrix = np.load(os.path.join(self.base_dir, manifest["matrix"]), mmap_mode="r")
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        if len(user_ids) > matrix.shape[0]:
+            raise RuntimeError("Voiceprint index ids do not match matrix rows")
+
+        user_ids = list(user_ids)
+        self._view = _View(
+            self._view.generation + 1,
+            user_ids,
+            {uid: i for i, uid in enumerate(user_ids)},
+            matrix[: len(user_ids)],
+        )
+        self._stamp = self._index_stamp()
+        self._last_check = time.monotonic()
+        self._loaded = True
+
+    def _write_packed(self, user_ids: List[str], matrix: np.ndarray) -> None:
+        os.makedirs(self.base_dir, exist_ok=True)
+        version = f"{time.time_ns()}-{os.getpid()}"
+        matrix_name = f"{INDEX_MATRIX_PREFIX}{version}.npy"
+        tmp_manifest = f"{self.index_path}.{version}.tmp"
+
+        with open(os.path.join(self.base_dir, matrix_name), "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump({"matrix": matrix_name, "user_ids": user_ids}, f)
+
+        # The manifest doubles as the version stamp, so it is published last.
+        os.replace(tmp_manifest, self.index_path)
+        self._remove_stale_matrices(keep=matrix_name)
+
+    def _remove_stale_matrices(self, keep: str) -> None:
+        for entry in os.scandir(self.base_dir):
+            if entry.name.startswith(INDEX_MATRIX_PREFIX) and entry.name != keep:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    # Still mapped by a worker (Windows); removed on a later rewrite.
+                    pass
+
+    def _rebuild_locked(self) -> None:
+        files = self._voiceprint_files()
+        user_ids = sorted(files)
+        rows = [_normalise(np.load(files[uid].path)) for uid in user_ids]
+        if rows:
+            matrix = np.vstack(rows)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._write_packed(user_ids, matrix)
+        self._open_packed()
+        logger.info("Packed %d voiceprints", len(user_ids))
+
+    def _load_locked(self) -> None:
+        if self._index_is_current(self._voiceprint_files()):
+            self._open_packed()
+        else:
+            self._rebuild_locked()
+
+    def _reopen_manifest_locked(self) -> None:
+        """
+        Open whatever the last writer published, judging it by the manifest alone.
+        The per-user files aren't scanned: the caller is about to write new ones,
+        which would otherwise look newer than the index and force a full rebuild.
+        """
+        try:
+            manifest = self._read_manifest()
+        except (OSError, ValueError):
+            manifest = None
+        if manifest is None or not os.path.exists(os.path.join(self.base_dir, manifest["matrix"])):
+            self._rebuild_locked()
+        else:
+            self._open_packed()
+
+    def rebuild(self) -> None:
+        """
+        Re-pack every per-user voiceprint file into the index matrix.
+        """
+        with self._lock, _exclusive(self.lock_path):
+            self._rebuild_locked()
+
+    def load(self) -> None:
+        """
+        Open the packed index, rebuilding it first if per-user files changed.
+        """
+        with self._lock:
+            if self._index_is_current(self._voiceprint_files()):
+                self._open_packed()
+                return
+            with _exclusive(self.lock_path):
+                # Another process may have rebuilt it while we waited
+                self._load_locked()
+
+    def _ensure_fresh(self) -> None:
+        if not self._loaded:
+            self.load()
+            return
+
+        now = time.monotonic()
+        if now - self._last_check < STALE_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._last_check = now
+            stamp = self._index_stamp()
+            if stamp == self._stamp:
+                return
+            try:
+                if stamp is None:
+                    self.rebuild()
+                else:
+                    self._open_packed()
+            except (OSError, ValueError) as e:
+                # Caught mid-rewrite by another worker; keep the current view and retry later.
+                logger.warning("Reload deferred: %s", e)
+
+    # ----- queries -----
+
+    def _current(self) -> _View:
+        self._ensure_fresh()
+        return self._view
+
+    def contains(self, user_id: str) -> bool:
+        return user_id in self._current().rows
+
+    def get(self, user_id: str) -> Optional[np.ndarray]:
+        """
+        Return the stored (unit-length) voiceprint for user_id, or None if not enrolled.
+        """
+        view = self._current()
+        row = view.rows.get(user_id)
+        if row is None:
+            return None
+        return np.asarray(view.matrix[row])
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._current().matrix
+
+    @property
+    def user_ids(self) -> List[str]:
+        return list(self._current().user_ids)
+
+    def __len__(self) -> int:
+        return len(self._current().user_ids)
+
+    def snapshot(self) -> Tuple[int, List[str], np.ndarray]:
+        """
+        (generation, user_ids, matrix) read together, so rows line up with ids even if
+        the index is reloaded mid-query. Generation changes whenever the index does.
+        The id list is shared, not copied: treat it as read-only.
+        """
+        view = self._current()
+        return view.generation, view.user_ids, view.matrix
+
+    # ----- updates -----
+
+    def add(self, user_id: str, embedding: np.ndarray) -> None:
+        """
+        Insert or replace one voiceprint and publish the new index to other workers.
+        """
+        self.add_many({user_id: embedding})
+
+    def add_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """
+        Insert or replace many voiceprints with a single index rewrite.
+        """
+        if not embeddings:
+            return
+        new = {uid: _normalise(emb) for uid, emb in embeddings.items()}
+        dim = next(iter(new.values())).shape[0]
+        with self._lock, _exclusive(self.lock_path):
+            # Layer ours on top of whatever the last writer published, however
+            # recently; an mtime comparison can miss a rewrite within one tick.
+            # Only the manifest is read, so an enrollment costs O(1) file reads.
+            self._reopen_manifest_locked()
+
+            view = self._view
+            user_ids = list(view.user_ids)
+            if view.matrix.size:
+                matrix = np.array(view.matrix, dtype=np.float32)
+            else:
+                matrix = np.zeros((0, dim), dtype=np.float32)
+
+            appended = []
+            for uid, emb in new.items():
+                row = view.rows.get(uid)
+                if row is None:
+                    user_ids.append(uid)
+                    appended.append(emb)
+                else:
+                    matrix[row] = emb
+            if appended:
+                matrix = np.vstack([matrix, np.stack(appended)])
+
+            self._write_packed(user_ids, matrix)
+            self._open_packed()
+
+
+@contextmanager
+def _exclusive(lock_path: str):
+    """
+    Exclusive lock on lock_path shared by every process using the same index directory.
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 s; keep waiting for the writer
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _normalise(embedding: np.ndarray) -> np.ndarray:
+    emb = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    return emb / (np.linalg.norm(emb) + 1e-9)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_voiceprint_index() -> VoiceprintIndex:
+    """
+    Process-wide voiceprint index, loaded on first use.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = VoiceprintIndex()
+    return _index
@@ -0,0 +1,127 @@
+"""
+Pool of faster-whisper models with a bounded wait queue.
+
+Each instance runs up to WHISPER_NUM_WORKERS transcriptions at once with
+WHISPER_CPU_THREADS threads each; by default the cores are split evenly across
+all concurrent slots so parallel requests don't oversubscribe the host.
+Requests beyond the free slots wait, up to WHISPER_MAX_QUEUE of them for at most
+WHISPER_QUEUE_TIMEOUT seconds, before WhisperPoolFull is raised.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Callable, List
+
+WHISPER_INSTANCES = int(os.environ.get("MESHPE_WHISPER_INSTANCES", "1"))
+WHISPER_NUM_WORKERS = int(os.environ.get("MESHPE_WHISPER_NUM_WORKERS", "1"))
+WHISPER_CPU_THREADS = int(os.environ.get("MESHPE_WHISPER_CPU_THREADS", "0"))  # 0 = split cores evenly
+WHISPER_MAX_QUEUE = int(os.environ.get("MESHPE_WHISPER_MAX_QUEUE", "16"))
+WHISPER_QUEUE_TIMEOUT = float(os.environ.get("MESHPE_WHISPER_QUEUE_TIMEOUT", "30"))
+
+
+class WhisperPoolFull(RuntimeError):
+    pass
+
+
+def default_cpu_threads(instances: int, num_workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, instances * num_workers))
+
+
+class WhisperPool:
+    def __init__(
+        self,
+        loader: Callable[[int, int], object],
+        instances: int = WHISPER_INSTANCES,
+        num_workers: int = WHISPER_NUM_WORKERS,
+        cpu_threads: int = WHISPER_CPU_THREADS,
+        max_queue: int = WHISPER_MAX_QUEUE,
+        queue_timeout: float = WHISPER_QUEUE_TIMEOUT,
+    ):
+        """
+        loader(cpu_threads, num_workers) builds one model instance.
+        """
+        self.instances = max(1, instances)
+        self.num_workers = max(1, num_workers)
+        self.cpu_threads = cpu_threads or default_cpu_threads(self.instances, self.num_workers)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._models: List[object] = [loader(self.cpu_threads, self.num_workers) for _ in range(self.instances)]
+        # One token per concurrent slot; an instance with num_workers=N appears N times.
+        self._idle: "queue.Queue[object]" = queue.Queue()
+        for _ in range(self.num_workers):
+            for model in self._models:
+                self._idle.put(model)
+
+        self._stats_lock = threading.Lock()
+        self._waiting = 0
+        self._busy = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def slots(self) -> int:
+        return self.instances * self.num_workers
+
+    def _acquire(self):
+        with self._stats_lock:
+            if self._waiting >= self.max_queue and self._idle.empty():
+                self._rejected += 1
+                raise WhisperPoolFull(f"Whisper queue full ({self._waiting} waiting)")
+            self._waiting += 1
+
+        start = time.monotonic()
+        try:
+            model = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            with self._stats_lock:
+                self._rejected += 1
+            raise WhisperPoolFull(f"No Whisper worker free after {self.queue_timeout:.0f}s")
+        finally:
+            waited = time.monotonic() - start
+            with self._stats_lock:
+                self._waiting -= 1
+
+        with self._stats_lock:
+            self._busy += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return model
+
+    def _release(self, model) -> None:
+        with self._stats_lock:
+            self._busy -= 1
+            self._completed += 1
+        self._idle.put(model)
+
+    def transcribe(self, audio, **options):
+        """
+        Same contract as WhisperModel.transcribe, except segments come back as a list:
+        decoding is lazy, so it has to finish while the slot is still held.
+        """
+        model = self._acquire()
+        try:
+            segments, info = model.transcribe(audio, **options)
+            return list(segments), info
+        finally:
+            self._release(model)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            acquired = self._completed + self._busy
+            return {
+                "instances": self.instances,
+                "num_workers": self.num_workers,
+                "cpu_threads": self.cpu_threads,
+                "slots": self.slots,
+                "busy": self._busy,
+                "queue_depth": self._waiting,
+                "max_queue": self.max_queue,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(1000 * self._wait_total / acquired, 2) if acquired else 0.0,
+                "max_wait_ms": round(1000 * self._wait_max, 2),
+            }
@@ -5,8 +5,12 @@ import sys
 if __name__ == "__main__":
     # Ensure we are running from the project root
     sys.path.append(os.getcwd())
-    
+
+    # Auto-reload is for local development only: it runs the app in a child
+    # process that restarts (and reloads every model) on each file change.
+    reload = os.environ.get("MESHPE_RELOAD", "0") == "1"
+
     print("Starting MeshPe Backend on http://localhost:8000")
-    print("Note: First startup may take time to load ML models...")
-    
-    uvicorn.run("backend.app:app", host="0.0.0.0", port=8000, reload=True)
+    print("Models warm up in the background; GET /health/ready returns 200 once they are loaded.")
+
+    uvicorn.run("backend.app:app", host="0.0.0.0", port=8000, reload=reload)
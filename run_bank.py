@@ -13,7 +13,7 @@ from bless import (
 # Import decryption logic from backend
 # Assuming this script is run from the project root
 try:
-    from backend.services.mesh_service import _rsa_decrypt_with_bank_private_key, _aes_decrypt_packet
+    from backend.services.mesh_service import decode_from_wire, decrypt_packet, is_batch, unseal_batch
 except ImportError:
     print("Error: Could not import backend services. Make sure you are running from the project root.")
     exit(1)
@@ -32,19 +32,11 @@ def process_packet(packet: dict):
     """
     logger.info("\n--- [BANK NODE: PROCESSING PACKET] ---")
     try:
-        logger.info(f"Received Encrypted Key: {packet['encrypted_key']}")
-        
-        # 1) Recover AES session key
-        aes_key = _rsa_decrypt_with_bank_private_key(packet["encrypted_key"])
-        logger.info(f"Decrypted AES Key: {aes_key.hex()}")
+        logger.info(f"Received packet {packet.get('packet_id')} (version {packet.get('v', 1)})")
 
-        # 2) Decrypt packet JSON
-        plaintext = _aes_decrypt_packet(
-            aes_key,
-            packet["iv"],
-            packet["ciphertext"],
-            packet["tag"],
-        )
+        # 1) Recover the AES session key (RSA unwrap or X25519 agreement) and
+        # 2) decrypt the packet JSON
+        plaintext = decrypt_packet(packet)
         logger.info(f"Decrypted Payload (Plaintext): {plaintext}")
 
         # 3) Parse JSON
@@ -55,6 +47,24 @@ def process_packet(packet: dict):
     except Exception as e:
         logger.error(f"Failed to process packet: {e}")
 
+def process_batch(batch: dict):
+    """
+    Unseals a batch: one key recovery, then each record verified on its own.
+    """
+    logger.info(f"\n--- [BANK NODE: PROCESSING BATCH OF {len(batch['records'])}] ---")
+    try:
+        accepted = 0
+        for packet_id, plaintext in unseal_batch(batch):
+            if plaintext is None:
+                logger.error(f"Rejected packet {packet_id}: authentication failed")
+                continue
+            payload = json.loads(plaintext.decode("utf-8"))
+            logger.info(f"PAYMENT RECEIVED: {payload}")
+            accepted += 1
+        logger.info(f"--- [BATCH DONE: {accepted}/{len(batch['records'])} ACCEPTED] ---\n")
+    except Exception as e:
+        logger.error(f"Failed to process batch: {e}")
+
 def write_request_callback(
     characteristic: BlessGATTCharacteristic,
     value: Any,
@@ -65,9 +75,13 @@ def write_request_callback(
     """
     logger.info(f"[Bank] Received write request: {len(value)} bytes")
     try:
-        packet = json.loads(value.decode('utf-8'))
+        # Binary mesh frame or legacy hex JSON
+        packet = decode_from_wire(bytes(value))
         logger.info("[Bank] Packet received. Processing...")
-        process_packet(packet)
+        if is_batch(packet):
+            process_batch(packet)
+        else:
+            process_packet(packet)
     except Exception as e:
         logger.error(f"[Bank] Failed to parse packet: {e}")
 
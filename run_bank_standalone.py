@@ -6,12 +6,30 @@ import sys
 from binascii import unhexlify
 
 # Dependencies: pip install pycryptodome
-from Crypto.PublicKey import RSA
+from Crypto.PublicKey import ECC, RSA
 from Crypto.Cipher import AES as CryptoAES
 from Crypto.Cipher import PKCS1_OAEP
+from Crypto.Hash import SHA256
+from Crypto.Protocol.DH import import_x25519_public_key, key_agreement
+from Crypto.Protocol.KDF import HKDF
+
+# Binary mesh frames: run from the project root, or copy backend/utils/mesh_frame.py
+# (standard library only) next to this file. Without it only JSON packets are accepted.
+try:
+    from backend.utils.mesh_frame import decode_frame, is_frame
+except ImportError:
+    try:
+        from mesh_frame import decode_frame, is_frame
+    except ImportError:
+        decode_frame = None
+        def is_frame(data) -> bool:
+            return data[:2] == b"MP"
 
 # --- CONFIGURATION ---
 BANK_KEY_FILE = "bank_private.pem"
+# Only needed for version 2 packets (X25519 sealing)
+BANK_X25519_KEY_FILE = "bank_x25519_private.pem"
+X25519_HKDF_INFO = b"meshpe-packet-v2"  # must match backend/crypto/x25519_utils.py
 RFCOMM_CHANNEL = 4  # Port for Bluetooth communication
 
 # Configure logging
@@ -20,18 +38,67 @@ logger = logging.getLogger("BankNode")
 
 # --- CRYPTO UTILS ---
 
+# Parsed key and its OAEP cipher, reused until the key file changes on disk
+_key_cache = {"stamp": None, "cipher": None}
+
 def load_private_key():
+    """
+    Returns a PKCS1_OAEP cipher for the bank key. The PEM is only re-read and
+    re-parsed when its mtime or size changes.
+    """
     if not os.path.exists(BANK_KEY_FILE):
         logger.error(f"CRITICAL: '{BANK_KEY_FILE}' not found!")
         logger.error("Please copy 'bank_private.pem' from the Sender device to this folder.")
         return None
-    with open(BANK_KEY_FILE, "rb") as f:
-        return RSA.import_key(f.read())
+    st = os.stat(BANK_KEY_FILE)
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _key_cache["stamp"] != stamp:
+        with open(BANK_KEY_FILE, "rb") as f:
+            _key_cache["cipher"] = PKCS1_OAEP.new(RSA.import_key(f.read()))
+        _key_cache["stamp"] = stamp
+    return _key_cache["cipher"]
 
 def decrypt_rsa(encrypted_hex: str, private_key):
-    cipher = PKCS1_OAEP.new(private_key)
+    """
+    private_key is the cipher from load_private_key (a bare RSA key also works).
+    """
+    cipher = PKCS1_OAEP.new(private_key) if isinstance(private_key, RSA.RsaKey) else private_key
     return cipher.decrypt(unhexlify(encrypted_hex))
 
+_x25519_cache = {"stamp": None, "key": None, "public": None}
+
+def load_x25519_private_key():
+    """
+    The bank's X25519 key, re-read only when the file changes.
+    """
+    if not os.path.exists(BANK_X25519_KEY_FILE):
+        logger.error(f"CRITICAL: '{BANK_X25519_KEY_FILE}' not found!")
+        logger.error("Version 2 packets need 'bank_x25519_private.pem' copied from the Sender device.")
+        return None
+    st = os.stat(BANK_X25519_KEY_FILE)
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _x25519_cache["stamp"] != stamp:
+        with open(BANK_X25519_KEY_FILE, "rb") as f:
+            key = ECC.import_key(f.read())
+        _x25519_cache.update(stamp=stamp, key=key, public=key.public_key().export_key(format="raw"))
+    return _x25519_cache["key"]
+
+def derive_x25519(epk_hex: str, private_key):
+    """
+    (aes_key, nonce) agreed with the sender's ephemeral key.
+    """
+    epk = unhexlify(epk_hex)
+    shared = key_agreement(
+        static_priv=private_key, static_pub=import_x25519_public_key(epk), kdf=lambda secret: secret
+    )
+    okm = HKDF(shared, 44, salt=epk + _x25519_cache["public"], hashmod=SHA256, context=X25519_HKDF_INFO)
+    return okm[:32], okm[32:]
+
+def decrypt_x25519(epk_hex: str, ciphertext_hex: str, tag_hex: str, private_key):
+    aes_key, nonce = derive_x25519(epk_hex, private_key)
+    cipher = CryptoAES.new(aes_key, CryptoAES.MODE_GCM, nonce=nonce)
+    return cipher.decrypt_and_verify(unhexlify(ciphertext_hex), unhexlify(tag_hex))
+
 def decrypt_aes(aes_key: bytes, iv_hex: str, ciphertext_hex: str, tag_hex: str):
     iv = unhexlify(iv_hex)
     ciphertext = unhexlify(ciphertext_hex)
@@ -39,33 +106,90 @@ def decrypt_aes(aes_key: bytes, iv_hex: str, ciphertext_hex: str, tag_hex: str):
     cipher = CryptoAES.new(aes_key, CryptoAES.MODE_GCM, nonce=iv)
     return cipher.decrypt_and_verify(ciphertext, tag)
 
+def unseal_batch(batch: dict):
+    """
+    One key recovery for the whole batch, then every record verified on its own.
+    Yields (packet_id, plaintext), with None for a record that fails to verify.
+    Mirrors backend/services/mesh_service.py.
+    """
+    if batch.get("v", 1) == 2:
+        private_key = load_x25519_private_key()
+        if not private_key:
+            return
+        batch_key, _ = derive_x25519(batch["epk"], private_key)
+    else:
+        private_key = load_private_key()
+        if not private_key:
+            return
+        batch_key = decrypt_rsa(batch["encrypted_key"], private_key)
+
+    seen = set()
+    for record in batch["records"]:
+        packet_id, n = record.get("packet_id"), record.get("n")
+        if not isinstance(n, int) or n in seen:
+            yield packet_id, None
+            continue
+        seen.add(n)
+        try:
+            cipher = CryptoAES.new(batch_key, CryptoAES.MODE_GCM, nonce=n.to_bytes(12, "big"))
+            cipher.update(packet_id.encode())
+            yield packet_id, cipher.decrypt_and_verify(unhexlify(record["ciphertext"]), unhexlify(record["tag"]))
+        except (KeyError, ValueError, AttributeError):
+            yield packet_id, None
+
 # --- BLUETOOTH SERVER (RFCOMM) ---
 
-def process_packet(data: str):
+def process_packet(data):
     """
-    Decrypts and processes the received packet.
+    Decrypts and processes the received packet (binary frame or JSON).
     """
     logger.info("\n--- [BANK NODE: PROCESSING PACKET] ---")
     
-    private_key = load_private_key()
-    if not private_key:
-        return
-
     try:
-        packet = json.loads(data)
-        logger.info(f"Received Encrypted Key: {packet['encrypted_key'][:20]}...")
-        
-        # 1) Recover AES session key
-        aes_key = decrypt_rsa(packet["encrypted_key"], private_key)
-        logger.info(f"Decrypted AES Key: {aes_key.hex()}")
-
-        # 2) Decrypt packet JSON
-        plaintext = decrypt_aes(
-            aes_key,
-            packet["iv"],
-            packet["ciphertext"],
-            packet["tag"],
-        )
+        if isinstance(data, bytes) and is_frame(data):
+            if decode_frame is None:
+                logger.error("Received a binary frame but mesh_frame.py is not available.")
+                return
+            packet = decode_frame(data)
+        else:
+            packet = json.loads(data)
+        version = packet.get("v", 1)
+
+        if "records" in packet:
+            accepted = 0
+            for packet_id, plaintext in unseal_batch(packet):
+                if plaintext is None:
+                    logger.error(f"Rejected packet {packet_id}: authentication failed")
+                    continue
+                logger.info(f"PAYMENT RECEIVED: {json.loads(plaintext.decode('utf-8'))}")
+                accepted += 1
+            logger.info(f"--- [BATCH DONE: {accepted}/{len(packet['records'])} ACCEPTED] ---\n")
+            return
+
+        if version == 2:
+            # 1+2) X25519 agreement with the ephemeral key, then AES-GCM decrypt
+            private_key = load_x25519_private_key()
+            if not private_key:
+                return
+            logger.info(f"Received Ephemeral Key: {packet['epk'][:20]}...")
+            plaintext = decrypt_x25519(packet["epk"], packet["ciphertext"], packet["tag"], private_key)
+        else:
+            private_key = load_private_key()
+            if not private_key:
+                return
+            logger.info(f"Received Encrypted Key: {packet['encrypted_key'][:20]}...")
+
+            # 1) Recover AES session key
+            aes_key = decrypt_rsa(packet["encrypted_key"], private_key)
+            logger.info(f"Decrypted AES Key: {aes_key.hex()}")
+
+            # 2) Decrypt packet JSON
+            plaintext = decrypt_aes(
+                aes_key,
+                packet["iv"],
+                packet["ciphertext"],
+                packet["tag"],
+            )
         logger.info(f"Decrypted Payload (Plaintext): {plaintext}")
 
         # 3) Parse JSON
@@ -107,7 +231,7 @@ def run_server():
                 
                 if full_data:
                     logger.info(f"Received total {len(full_data)} bytes")
-                    process_packet(full_data.decode('utf-8'))
+                    process_packet(full_data)
             except Exception as e:
                 logger.error(f"Error reading data: {e}")
             finally:
@@ -1,5 +1,4 @@
 import asyncio
-import json
 import logging
 from typing import Any
 
@@ -11,6 +10,9 @@ from bless import (
 )
 from bleak import BleakScanner, BleakClient
 
+# Assuming this script is run from the project root (stdlib-only module)
+from backend.utils.mesh_frame import FrameError, decrement_ttl, is_frame
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("RelayNode")
@@ -31,21 +33,29 @@ def write_request_callback(
     Callback when a device writes to the Packet Characteristic.
     """
     logger.info(f"[Relay] Received write request: {len(value)} bytes")
+    data = bytes(value)
+    if not is_frame(data):
+        # Legacy JSON packet: forwarded exactly as received
+        packet_queue.put_nowait(data)
+        return
     try:
-        # Decode just to ensure it's valid JSON, but we don't need to read the content
-        # since it's encrypted.
-        packet = json.loads(value.decode('utf-8'))
-        logger.info("[Relay] Packet received successfully. Queuing for forward...")
-        packet_queue.put_nowait(packet)
-    except Exception as e:
-        logger.error(f"[Relay] Failed to parse packet: {e}")
+        # Only the header is read (and its ttl rewritten); the sealed body stays opaque.
+        forwarded = decrement_ttl(data)
+    except FrameError as e:
+        logger.error(f"[Relay] Dropping malformed frame: {e}")
+        return
+    if forwarded is None:
+        logger.warning("[Relay] Frame TTL expired. Dropping.")
+        return
+    logger.info("[Relay] Frame received. Queuing for forward...")
+    packet_queue.put_nowait(forwarded)
 
 async def forward_packets():
     """
     Continuously monitors the queue and forwards packets to the next hop.
     """
     while True:
-        packet = await packet_queue.get()
+        data = await packet_queue.get()
         logger.info("[Relay] Processing packet for forwarding...")
         
         # Scan for next hop (Bank or another Relay)
@@ -66,8 +76,7 @@ async def forward_packets():
         try:
             async with BleakClient(device) as client:
                 logger.info(f"[Relay] Connected to {device.address}")
-                payload = json.dumps(packet).encode('utf-8')
-                await client.write_gatt_char(PACKET_CHARACTERISTIC_UUID, payload, response=True)
+                await client.write_gatt_char(PACKET_CHARACTERISTIC_UUID, data, response=True)
                 logger.info("[Relay] Packet forwarded successfully!")
         except Exception as e:
             logger.error(f"[Relay] Forwarding failed: {e}")
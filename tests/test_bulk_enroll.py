@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pytest
+
+import backend.storage.user_store as user_store
+import ml.voiceprint_index as voiceprint_index
+from ml.bulk_enroll import _Writer
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(voiceprint_index.VOICEPRINT_DIR)
+    monkeypatch.setattr(voiceprint_index, "_index", None)
+    monkeypatch.setattr(user_store, "DB_FILE", str(tmp_path / "users.db"))
+    monkeypatch.setattr(user_store, "USERS_FILE", str(tmp_path / "users.json"))
+    user_store._cache.invalidate()
+    return user_store
+
+
+def _enroll(user: dict, language: str = "english") -> None:
+    writer = _Writer(journal="progress.jsonl", write_users=True, language=language)
+    writer.add(user, np.ones(4, dtype=np.float32), used=1, errors=[])
+    writer.flush()
+
+
+def test_reenrolling_keeps_profile_fields_the_manifest_leaves_out(store):
+    store.create_or_update_user("9999", "Asha Rao", "+91 9999", "hindi")
+
+    _enroll({"user_id": "9999", "files": ["a.wav"]})
+
+    assert store.get_user("9999") == {"id": "9999", "name": "Asha Rao", "phone": "+91 9999", "language": "hindi"}
+
+
+def test_reenrolling_updates_only_supplied_fields(store):
+    store.create_or_update_user("9999", "Asha Rao", "+91 9999", "hindi")
+
+    _enroll({"user_id": "9999", "files": ["a.wav"], "language": "tamil"})
+
+    assert store.get_user("9999") == {"id": "9999", "name": "Asha Rao", "phone": "+91 9999", "language": "tamil"}
+
+
+def test_new_user_gets_defaults(store):
+    _enroll({"user_id": "8888", "files": ["a.wav"]}, language="hindi")
+
+    assert store.get_user("8888") == {"id": "8888", "name": "8888", "phone": "8888", "language": "hindi"}